@@ -42,9 +42,9 @@ if __name__ == '__main__':
 
     graph_path = os.path.join(project_dir, 'graphs/small.csv')
 
-    # Parameters for solve function.
-    only_one_const = 10000000.
-    order_const = 1.
+    # Parameters for solve function (None - calibrated from costs of problem).
+    only_one_const = None
+    order_const = None
 
     
     valid_files = get_file_from_user()
@@ -57,6 +57,8 @@ if __name__ == '__main__':
         # Reading problem from file.
         path = os.path.join(project_dir, 'tests/cvrp/' + t)
         problem, g= create_vrp_problem_time(path)
+        print("Nodes:", len(problem.costs), "Vehicles:", len(problem.capacities),
+                "Capacity:", max(problem.capacities))
         problem.first_source = True
         problem.last_source = True
 
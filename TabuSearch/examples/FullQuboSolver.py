@@ -14,9 +14,9 @@ if __name__ == '__main__':
 
     graph_path = os.path.join(project_dir, 'graphs/small.csv')
 
-    # Parameters for solve function.
-    only_one_const = 10000000.
-    order_const = 1.
+    # Parameters for solve function (None - calibrated from costs of problem).
+    only_one_const = None
+    order_const = None
 
     for t in ['small_graph1', 'small_graph2']:
         print("Test : ", t)
@@ -13,9 +13,9 @@ from input import *
 
 if __name__ == '__main__':
 
-    # Parameters for solve function.
-    only_one_const = 10000000.
-    order_const = 1.
+    # Parameters for solve function (None - calibrated from costs of problem).
+    only_one_const = None
+    order_const = None
 
     for t in ['example_medium4', 'example_medium5', 'example_medium6']:
         print("Test : ", t)
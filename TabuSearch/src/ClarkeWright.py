@@ -18,6 +18,7 @@ print("Total cost : ", solution.total_cost())
 print("Total Time : ", solution.total_time())
 print("CHECK: ", solution.all_weights())
 def plot_all_solutions2(g, solutions):
+    g = coordinates_graph(g)
     node_positions = nx.get_node_attributes(g, "pos")
     plt.figure(figsize=(16, 8))
 
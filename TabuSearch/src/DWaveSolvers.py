@@ -1,31 +1,270 @@
 # File simplifies communication with DWave solvers. 
 
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import neal
 import hybrid
+import dimod
+import numpy as np
+from annealer import SimulatedAnnealer, default_beta_range, qubo_matrix
 
-# Creates hybrid solver with hardcoded configuration.
-def hybrid_solver():
+# Samplers are created once for every configuration and reused by all calls,
+# creating them (especially hybrid workflow) costs more than solving small qubos.
+# Hybrid samplers have state (stop signal of workflow and subproblem sampler),
+# so they are cached separately by every thread.
+_samplers = dict()
+_thread_samplers = threading.local()
+
+# Types of solvers whose samplers have state.
+_stateful_types = ('qpu', 'hybrid-local')
+
+# Creates hybrid solver : tabu search racing with energy impact decomposition,
+# whose subproblems are solved by subproblem_sampler (QPU sampler by default).
+# max_time - time limit of the loop in seconds, checked after every iteration (None - no limit).
+# size - number of variables of subproblems.
+# convergence - number of iterations without improvement after which loop stops.
+def hybrid_solver(max_time = None, subproblem_sampler = None, size = 30, convergence = 1):
+    if subproblem_sampler is None:
+        subproblem_sampler = hybrid.QPUSubproblemAutoEmbeddingSampler()
     workflow = hybrid.Loop(
         hybrid.RacingBranches(
-        hybrid.InterruptableTabuSampler(),
-        hybrid.EnergyImpactDecomposer(size=30, rolling=True, rolling_history=0.75)
-        | hybrid.QPUSubproblemAutoEmbeddingSampler()
-        | hybrid.SplatComposer()) | hybrid.ArgMin(), convergence=1)
+        hybrid.InterruptableTabuSampler(max_time=max_time),
+        hybrid.EnergyImpactDecomposer(size=size, rolling=True, rolling_history=0.75)
+        | subproblem_sampler
+        | hybrid.SplatComposer()) | hybrid.ArgMin(), convergence=convergence, max_time=max_time)
     return hybrid.HybridSampler(workflow)
 
+# Subproblem sampler returning ground state of subproblem found by exhaustive search.
+# Subproblems have 2^size states, so it should be used only for small sizes (up to about 20).
+class ExactSubproblemSampler(hybrid.traits.SubproblemSampler, hybrid.traits.SISO, hybrid.Runnable):
+    def next(self, state, **runopts):
+        subsamples = dimod.ExactSolver().sample(state.subproblem).truncate(1)
+        return state.updated(subsamples=subsamples)
+
+# Simulated annealing subproblem sampler which can be run again after it was halted.
+# Racing branches halt it whenever tabu search finishes first and hybrid sampler
+# would stay halted in all next iterations of the loop (and next calls of cached solver).
+class AnnealingSubproblemSampler(hybrid.SimulatedAnnealingSubproblemSampler):
+    def next(self, state, **runopts):
+        self._stop_event.clear()
+        return super().next(state, **runopts)
+
+# Removes subsamples of previous subproblem from state. Decomposer doesn't remove them
+# and local samplers would use them as initial states of new subproblem.
+class DropStaleSubsamples(hybrid.traits.SISO, hybrid.Runnable):
+    def next(self, state, **runopts):
+        subsamples = state.get('subsamples')
+        if subsamples is not None and set(subsamples.variables) != set(state.subproblem.variables):
+            return state.updated(subsamples=None)
+        return state
+
+# Creates hybrid solver running only on this machine, with the same workflow as hybrid_solver.
+# subsolver - 'sa' (simulated annealing), 'tabu' or 'exact' solver of subproblems.
+# Other parameters are as in hybrid_solver.
+def local_hybrid_solver(max_time = None, size = 30, subsolver = 'sa', convergence = 3):
+    if subsolver == 'sa':
+        subproblem_sampler = AnnealingSubproblemSampler(num_reads=10, num_sweeps=1000)
+    elif subsolver == 'tabu':
+        subproblem_sampler = hybrid.TabuSubproblemSampler(num_reads=10)
+    elif subsolver == 'exact':
+        subproblem_sampler = ExactSubproblemSampler()
+    else:
+        raise ValueError('Unknown subsolver ' + str(subsolver) + '.')
+    return hybrid_solver(max_time, DropStaleSubsamples() | subproblem_sampler, size, convergence)
+
 # Gets cpu or qpu solver.
-# For qpu hybrid solver is used. For cpu qbsolv.
-def get_solver(solver_type):
-    solver = None
-    if solver_type == 'qpu':
-        solver = hybrid_solver()
+# For qpu hybrid solver is used. For cpu qbsolv. For hybrid-local hybrid solver
+# with local subproblem sampler, so it runs without access to QPU.
+# Solvers are cached, so every call with the same arguments returns the same instance
+# (hybrid solvers - the same instance in the same thread, they mustn't be run
+# by many threads at the same time).
+# time_limit - used only by hybrid solvers, which limit time of their workflow.
+# cached - if False, new solver is created and not cached.
+# options - parameters of local_hybrid_solver.
+def get_solver(solver_type, time_limit = None, cached = True, **options):
     if solver_type == 'cpu':
-        solver = neal.SimulatedAnnealingSampler()
+        time_limit = None
+    samplers = _samplers
+    if solver_type in _stateful_types:
+        if not hasattr(_thread_samplers, 'samplers'):
+            _thread_samplers.samplers = dict()
+        samplers = _thread_samplers.samplers
+    key = (solver_type, time_limit, tuple(sorted(options.items())))
+    solver = samplers.get(key) if cached else None
+    if solver is None:
+        if solver_type == 'qpu':
+            solver = hybrid_solver(time_limit)
+        if solver_type == 'hybrid-local':
+            solver = local_hybrid_solver(time_limit, **options)
+        if solver_type == 'cpu':
+            solver = neal.SimulatedAnnealingSampler()
+        if solver is not None and cached:
+            samplers[key] = solver
     return solver
 
-# Solves qubo on qpu. Returns list of solutions.
-def solve_qubo(qubo, solver_type = 'cpu'):
-    sampler = get_solver(solver_type)
-    response = sampler.sample_qubo(qubo.dict, num_reads=1000)
-    return list(response)[0]
+# Types of solvers taking parameters of simulated annealing.
+_local_types = ('cpu', 'sa')
+# Types of solvers running on this machine, their batches are solved in processes.
+_process_types = ('cpu', 'sa', 'hybrid-local')
+
+# Solver of qubos with fixed parameters of sampling.
+# Parameters :
+# solver_type - 'cpu', 'qpu' or 'hybrid-local', as in get_solver, or 'sa' for SimulatedAnnealer
+# working directly on sparse matrix of qubo
+# num_reads - number of samples of cpu and sa solvers
+# num_sweeps - number of sweeps of every read of cpu and sa solvers (None - default of sampler)
+# seed - seed of cpu and sa solvers (None - random)
+# time_limit - time limit of sampling in seconds (None - no limit). Cpu solver stops
+# after read which exceeded limit, sa solver after sweep, so something is always done.
+# Hybrid solvers use it as wall-clock limit of their workflow.
+# options - other keyword arguments of sampler (of SimulatedAnnealer for sa solver,
+# of local_hybrid_solver for hybrid-local solver).
+class QuboSolver:
+    def __init__(self, solver_type = 'cpu', num_reads = 1000, num_sweeps = None,
+            seed = None, time_limit = None, **options):
+        self.solver_type = solver_type
+        self.num_reads = num_reads
+        self.num_sweeps = num_sweeps
+        self.seed = seed
+        self.time_limit = time_limit
+        self.options = options
+
+    # Returns keyword arguments of sample method of sampler.
+    def _parameters(self):
+        if self.solver_type == 'hybrid-local':
+            return dict()
+        if self.solver_type not in _local_types:
+            return dict(self.options)
+        parameters = {'num_reads' : self.num_reads}
+        if self.num_sweeps is not None:
+            parameters['num_sweeps'] = self.num_sweeps
+        if self.seed is not None:
+            parameters['seed'] = self.seed
+        if self.time_limit is not None:
+            deadline = time.perf_counter() + self.time_limit
+            parameters['interrupt_function'] = lambda: time.perf_counter() > deadline
+        parameters.update(self.options)
+        return parameters
+
+    # Returns representation of qubo used by sampler : pair (linear, couplings)
+    # and indices of their variables for sa solver, BQM with integer labels otherwise.
+    def model(self, qubo):
+        if self.solver_type == 'sa':
+            return qubo_matrix(qubo)
+        return qubo.get_bqm(integer_labels = True)
+
+    # Solves qubo. Returns best solution as vector of values of variables,
+    # indexed by indices of variables in qubo (unused variables are 0).
+    # initial_states - array states x variables of qubo (for example from
+    # warm_start_states) used by cpu and sa solvers as initial states of reads.
+    def solve(self, qubo, initial_states = None):
+        return self.solve_model(self.model(qubo), qubo.size(), initial_states)
+
+    # Samples qubo. Returns triple (samples, variables, energies) : array reads x sampled
+    # variables (as returned by sampler, without copying), array of indices of these
+    # variables in qubo (other variables are 0) and array of energies of reads.
+    def sample(self, qubo, initial_states = None):
+        return self.sample_model(self.model(qubo), qubo.size(), initial_states)
+
+    # Solves model returned by model method for qubo with given number of variables.
+    def solve_model(self, model, size, initial_states = None):
+        samples, variables, energies = self.sample_model(model, size, initial_states)
+        vector = np.zeros(size, dtype=np.int8)
+        vector[variables] = samples[np.argmin(energies)]
+        return vector
+
+    # Samples model as solve_model, returns all reads as sample.
+    def sample_model(self, model, size, initial_states = None):
+        parameters = self._parameters()
+        if self.solver_type == 'sa':
+            linear, couplings, variables = model
+            if initial_states is not None:
+                initial_states = np.resize(np.asarray(initial_states)[:, variables],
+                        (self.num_reads, len(variables)))
+                if 'beta_range' not in parameters:
+                    parameters['beta_range'] = _warm_beta_range(default_beta_range(linear, couplings))
+            annealer = SimulatedAnnealer(**parameters)
+            states, energies = annealer.sample(linear, couplings, initial_states)
+            return states, np.asarray(variables, dtype=np.int64), energies
+
+        if initial_states is not None and self.solver_type == 'cpu':
+            variables = list(model.variables)
+            states = np.asarray(initial_states)[:self.num_reads, variables]
+            parameters['initial_states'] = (states, variables)
+            parameters['initial_states_generator'] = 'tile'
+            if 'beta_range' not in parameters:
+                parameters['beta_range'] = _warm_beta_range(neal.default_beta_range(model))
+
+        options = self.options if self.solver_type == 'hybrid-local' else dict()
+        sampler = get_solver(self.solver_type, self.time_limit, **options)
+        response = sampler.sample(model, **parameters)
+        record = response.record
+        return record.sample, np.asarray(list(response.variables), dtype=np.int64), record.energy
+
+# Returns range of inverse temperatures for annealing from initial states : the last quarter
+# (geometrically) of default schedule, so initial states are refined, not forgotten.
+def _warm_beta_range(beta_range):
+    hot, cold = beta_range
+    return hot ** 0.25 * cold ** 0.75, cold
+
+# Solves model and measures time of solving. Used by workers of solve_qubos.
+def _solve_timed(solver, model, size):
+    start = time.perf_counter()
+    vector = solver.solve_model(model, size)
+    return vector, time.perf_counter() - start
+
+# Solves qubo on qpu. Returns best solution as vector of values of variables,
+# indexed by indices of variables in qubo (unused variables are 0).
+# Other parameters are parameters of QuboSolver.
+# solver_type can also be QuboSolver, so configured solver can be passed
+# as solver_type through solve methods of VRP solvers.
+# initial_states - as in QuboSolver.solve.
+def solve_qubo(qubo, solver_type = 'cpu', initial_states = None, **parameters):
+    if isinstance(solver_type, QuboSolver):
+        return solver_type.solve(qubo, initial_states)
+    return QuboSolver(solver_type, **parameters).solve(qubo, initial_states)
+
+# Samples qubo. Returns triple (samples, variables, energies) as QuboSolver.sample.
+# Parameters are as in solve_qubo.
+def sample_qubo(qubo, solver_type = 'cpu', initial_states = None, **parameters):
+    if isinstance(solver_type, QuboSolver):
+        return solver_type.sample(qubo, initial_states)
+    return QuboSolver(solver_type, **parameters).sample(qubo, initial_states)
+
+# Solves list of qubos. Returns list of pairs (vector, time) in order of qubos,
+# where vector is as in solve_qubo and time is time of solving in seconds.
+# Cpu and sa solvers run in pool of processes, other solvers (waiting mostly for remote
+# samplers) in pool of threads, so submissions overlap. Hybrid samplers are cached
+# for every thread (see get_solver), so threads never share one.
+# workers - number of processes or threads (None - default of executor, 1 - no pool).
+# Other parameters are as in solve_qubo.
+def solve_qubos(qubos, solver_type = 'cpu', workers = None, **parameters):
+    solver = solver_type
+    if not isinstance(solver, QuboSolver):
+        solver = QuboSolver(solver_type, **parameters)
+    tasks = [(solver.model(qubo), qubo.size()) for qubo in qubos]
+    if len(tasks) == 0:
+        return list()
+
+    if workers == 1 or len(tasks) == 1:
+        return [_solve_timed(solver, model, size) for (model, size) in tasks]
+
+    if solver.solver_type in _process_types:
+        executor = ProcessPoolExecutor(max_workers = workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers = workers)
+    with executor:
+        futures = [executor.submit(_solve_timed, solver, model, size) for (model, size) in tasks]
+        return [future.result() for future in futures]
+
+# Returns lowest energy sample of response as vector of given size.
+# Variables of response should be labelled by integers.
+# Only record of response is used, samples aren't materialized.
+def sample_vector(response, size):
+    record = response.record
+    best = np.argmin(record.energy)
+    vector = np.zeros(size, dtype=np.int8)
+    vector[np.asarray(list(response.variables), dtype=np.int64)] = record.sample[best]
+    return vector
     
@@ -0,0 +1,202 @@
+import math
+import numpy as np
+import scipy.sparse as sp
+
+# Simulated annealing of qubos working directly on sparse matrix of qubo.
+# Qubo with values of variables x has energy x . linear + x . couplings . x / 2,
+# where couplings is symmetric CSR matrix with zero diagonal.
+# Many replicas are annealed at once : states are rows of 2-D array and local fields
+# (couplings . x) of all replicas are updated incrementally after every flip.
+# Variables are divided into classes of variables not coupled with each other,
+# so whole class can be updated at once without changing results of Metropolis steps.
+
+# Returns pair (linear, couplings) of qubo restricted to variables with given indices
+# (used variables of qubo by default) and array of these indices.
+def qubo_matrix(qubo, variables = None):
+    rows, cols, values = qubo.get_coo()
+    if variables is None:
+        variables = qubo.used()
+    rows = np.searchsorted(variables, rows)
+    cols = np.searchsorted(variables, cols)
+    n = len(variables)
+
+    diagonal = rows == cols
+    linear = np.zeros(n)
+    np.add.at(linear, rows[diagonal], values[diagonal])
+    off = ~diagonal
+    upper = sp.coo_matrix((values[off], (rows[off], cols[off])), shape=(n, n))
+    couplings = (upper + upper.T).tocsr()
+    couplings.sum_duplicates()
+    return linear, couplings, variables
+
+# Greedy coloring of graph of couplings. Returns list of arrays of variables,
+# variables in one array aren't coupled.
+def color_classes(couplings):
+    n = couplings.shape[0]
+    indptr, indices = couplings.indptr, couplings.indices
+    colors = np.full(n, -1, dtype=np.int64)
+    # Variables with most couplings are colored first.
+    for i in np.argsort(-np.diff(indptr), kind='stable'):
+        used = set(colors[indices[indptr[i]:indptr[i + 1]]].tolist())
+        color = 0
+        while color in used:
+            color += 1
+        colors[i] = color
+    if n == 0:
+        return list()
+    order = np.argsort(colors, kind='stable')
+    return np.split(order, np.flatnonzero(np.diff(colors[order])) + 1)
+
+# Returns default (hot, cold) range of inverse temperatures. Hot temperature allows
+# the biggest possible change of energy with probability 1/2, cold one allows
+# the smallest change with probability 1/100.
+def default_beta_range(linear, couplings):
+    abs_couplings = abs(couplings)
+    max_delta = np.abs(linear) + np.asarray(abs_couplings.sum(axis=1)).ravel()
+    nonzero = np.concatenate([np.abs(linear[linear != 0]), abs_couplings.data[abs_couplings.data != 0]])
+    if len(nonzero) == 0:
+        return 1., 1.
+    return math.log(2) / max_delta.max(), math.log(100) / nonzero.min()
+
+# Returns array of inverse temperatures of given length.
+# schedule - 'geometric' or 'linear'.
+def beta_schedule(beta_range, length, schedule = 'geometric'):
+    hot, cold = beta_range
+    if schedule == 'geometric':
+        return np.geomspace(hot, cold, length)
+    if schedule == 'linear':
+        return np.linspace(hot, cold, length)
+    raise ValueError('Unknown schedule ' + str(schedule) + '.')
+
+# Returns energies of rows of states.
+def energies(linear, couplings, states):
+    states = np.asarray(states, dtype=float)
+    return states @ linear + 0.5 * np.einsum('ij,ij->i', states, (couplings @ states.T).T)
+
+# Simulated annealer with parameters of sampling.
+# Parameters :
+# num_reads - number of replicas annealed at once
+# num_sweeps - number of sweeps (every variable is updated once in a sweep)
+# beta_range - pair (hot, cold) of inverse temperatures (None - default_beta_range)
+# schedule - 'geometric' or 'linear' schedule of inverse temperatures, or array of them
+# patience - annealing stops if the best energy didn't improve for so many sweeps (None - never)
+# tempering - if True, replicas have fixed temperatures from schedule and neighbouring
+# replicas exchange states after every sweep (parallel tempering)
+# seed - seed of random generator
+# interrupt_function - function called after every sweep, sampling stops if it returns True
+class SimulatedAnnealer:
+    def __init__(self, num_reads = 64, num_sweeps = 1000, beta_range = None,
+            schedule = 'geometric', patience = None, tempering = False, seed = None,
+            interrupt_function = None):
+        self.num_reads = num_reads
+        self.num_sweeps = num_sweeps
+        self.beta_range = beta_range
+        self.schedule = schedule
+        self.patience = patience
+        self.tempering = tempering
+        self.seed = seed
+        self.interrupt_function = interrupt_function
+
+    # Returns betas of replicas in every sweep as array sweeps x replicas.
+    def _betas(self, linear, couplings, replicas):
+        if not isinstance(self.schedule, str):
+            betas = np.asarray(self.schedule, dtype=float)
+            length = replicas if self.tempering else self.num_sweeps
+            if len(betas) != length:
+                raise ValueError('Schedule should have ' + str(length) + ' values.')
+        else:
+            beta_range = self.beta_range
+            if beta_range is None:
+                beta_range = default_beta_range(linear, couplings)
+            length = replicas if self.tempering else self.num_sweeps
+            betas = beta_schedule(beta_range, length, self.schedule)
+
+        if self.tempering:
+            return np.broadcast_to(betas, (self.num_sweeps, replicas))
+        return np.broadcast_to(betas[:, None], (self.num_sweeps, replicas))
+
+    # Samples qubo given by linear and couplings (see qubo_matrix).
+    # initial_states - array replicas x variables of initial states (None - random states).
+    # Returns pair (states, energies) of the best states found by every replica.
+    def sample(self, linear, couplings, initial_states = None):
+        rng = np.random.default_rng(self.seed)
+        n = len(linear)
+        if initial_states is None:
+            states = rng.integers(0, 2, size=(self.num_reads, n), dtype=np.int8)
+        else:
+            states = np.array(initial_states, dtype=np.int8, ndmin=2)
+        replicas = len(states)
+        if n == 0:
+            return states, np.zeros(replicas)
+
+        # Variables are reordered so that every class is a slice and arrays are kept
+        # transposed (variables x replicas), so updates of a class touch contiguous rows.
+        classes = color_classes(couplings)
+        order = np.concatenate(classes)
+        bounds = np.cumsum([0] + [len(c) for c in classes])
+        slices = [slice(bounds[k], bounds[k + 1]) for k in range(len(classes))]
+        linear = linear[order]
+        couplings = couplings[order][:, order].tocsc()
+        # Columns of couplings of every class, used to update local fields after flips.
+        class_couplings = [couplings[:, c].tocsr() for c in slices]
+
+        states = np.ascontiguousarray(states[:, order].T)
+        fields = couplings @ states.astype(float)
+        energy = linear @ states + 0.5 * np.einsum('ij,ij->j', states, fields)
+        best_states = states.copy()
+        best_energy = energy.copy()
+        best = best_energy.min()
+        stale = 0
+
+        for beta in self._betas(linear, couplings, replicas):
+            for c, coupling in zip(slices, class_couplings):
+                x = states[c]
+                sign = 1. - 2. * x
+                delta = sign * (linear[c, None] + fields[c])
+                accept = rng.random(delta.shape) < np.exp(-beta * np.maximum(delta, 0))
+                if not accept.any():
+                    continue
+                flips = np.where(accept, sign, 0.)
+                states[c] = x + flips.astype(np.int8)
+                fields += coupling @ flips
+                energy += (delta * accept).sum(axis=0)
+
+            if self.tempering:
+                self._exchange(rng, beta, states, fields, energy)
+
+            improved = energy < best_energy
+            if improved.any():
+                best_states[:, improved] = states[:, improved]
+                best_energy[improved] = energy[improved]
+
+            # Early stopping when the best energy reaches plateau.
+            if best_energy.min() < best - 1e-9:
+                best = best_energy.min()
+                stale = 0
+            else:
+                stale += 1
+            if self.patience is not None and stale >= self.patience:
+                break
+            if self.interrupt_function is not None and self.interrupt_function():
+                break
+
+        result = np.empty((replicas, n), dtype=np.int8)
+        result[:, order] = best_states.T
+        return result, best_energy
+
+    # Exchanges states of neighbouring replicas of parallel tempering (in place).
+    # States and fields are arrays variables x replicas.
+    # Even and odd pairs are tried alternately, so every pair is independent.
+    def _exchange(self, rng, betas, states, fields, energy):
+        replicas = len(betas)
+        start = int(rng.integers(0, 2))
+        low = np.arange(start, replicas - 1, 2)
+        if len(low) == 0:
+            return
+        high = low + 1
+        log_p = (betas[low] - betas[high]) * (energy[low] - energy[high])
+        swap = log_p >= np.log(rng.random(len(low)) + 1e-300)
+        low, high = low[swap], high[swap]
+        for array in (states, fields):
+            array[:, low], array[:, high] = array[:, high].copy(), array[:, low].copy()
+        energy[low], energy[high] = energy[high].copy(), energy[low].copy()
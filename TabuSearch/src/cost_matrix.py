@@ -0,0 +1,382 @@
+# Compact representations of cost matrices of big instances.
+# Dense float64 matrix takes 8 * n^2 bytes, float32 matrix takes half of it.
+# Costs rounded to 1 / scale (for example to 0.1 by input_CMT_dataset) can be stored
+# exactly as integers in ScaledCosts, which also takes 4 * n^2 bytes for int32.
+# Matrices can be memory-mapped (np.memmap or ScaledCosts of np.memmap).
+# Costs of instances with coordinates can be computed on demand by DistanceOracle,
+# which stores only coordinates, cache of rows and lists of nearest nodes.
+
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Cost matrix stored as integers equal to costs multiplied by scale.
+# Indexing works as indexing of numpy matrix and returns real costs (as floats),
+# so it can be used instead of dense matrix : costs[i][j], costs[i, j], costs[rows, cols],
+# costs[np.ix_(rows, cols)] and iteration over rows are supported.
+# data - 2d integer array (or memmap)
+# scale - costs are data / scale
+class ScaledCosts:
+    def __init__(self, data, scale):
+        self.data = data
+        self.scale = scale
+        self.dtype = np.dtype(float)
+        self.ndim = 2
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        return self.data[key] / self.scale
+
+    def __setitem__(self, key, value):
+        self.data[key] = np.rint(np.asarray(value) * self.scale)
+
+    def __iter__(self):
+        return (row / self.scale for row in self.data)
+
+    # Returns dense float matrix (used by np.asarray).
+    def __array__(self, dtype = None, copy = None):
+        array = self.data / self.scale
+        return array if dtype is None else array.astype(dtype)
+
+    def copy(self):
+        return ScaledCosts(self.data.copy(), self.scale)
+
+    def view(self):
+        return ScaledCosts(self.data.view(), self.scale)
+
+    def setflags(self, write):
+        self.data.setflags(write=write)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+# Returns arrays of indices of rows and columns (broadcast together) selected by
+# indexing of n x n matrix with rows and cols. Indices are broadcast as by numpy indexing :
+# slices are outer dimensions.
+def _index_arrays(rows, cols, n):
+    row_slice, col_slice = isinstance(rows, slice), isinstance(cols, slice)
+    rows = np.arange(n)[rows] if row_slice else np.asarray(rows)
+    cols = np.arange(n)[cols] if col_slice else np.asarray(cols)
+    if row_slice:
+        rows = rows.reshape(rows.shape + (1,) * cols.ndim)
+    elif col_slice:
+        rows = rows[..., None]
+    return rows, cols
+
+# Returns euclidean distances between points a and b (arrays with coordinates in the last axis,
+# broadcast together) rounded to given number of decimals (None - no rounding).
+def euclidean_distances(a, b, decimals = None):
+    diff = np.asarray(a, dtype=float) - np.asarray(b, dtype=float)
+    dist = np.sqrt(diff[..., 0] * diff[..., 0] + diff[..., 1] * diff[..., 1])
+    if decimals is not None:
+        dist = np.round(dist, decimals)
+    return dist
+
+# Matrix of euclidean distances between nodes computed on demand from their coordinates.
+# Indexing works as indexing of dense matrix (as in ScaledCosts) and gives the same values
+# as input_CMT_dataset.distance_matrix. Rows are computed at once and the most recently
+# used ones are cached, so loops reading costs[i][j] along routes are cheap.
+# Oracle is read-only, copy returns dense matrix.
+# coords - (n, 2) array of coordinates
+# decimals - number of decimals distances are rounded to (None - no rounding)
+# dtype - type of returned distances
+# cache_bytes - memory limit of cache of rows
+# neighbors - number of nearest nodes precomputed for every node (see nearest)
+class DistanceOracle:
+    def __init__(self, coords, decimals = 1, dtype = float, cache_bytes = 2 ** 26, neighbors = 0):
+        self.coords = np.ascontiguousarray(coords, dtype=float)
+        self.decimals = decimals
+        self.dtype = np.dtype(dtype)
+        self.ndim = 2
+        self.cache_rows = max(1, cache_bytes // max(1, len(self.coords) * self.dtype.itemsize))
+        self._rows = OrderedDict()
+        self._nearest = dict()
+        self._lock = threading.Lock()
+        if neighbors > 0:
+            self.nearest(np.arange(len(self.coords)), neighbors)
+
+    @property
+    def shape(self):
+        return (len(self.coords), len(self.coords))
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + len(self._rows) * len(self.coords) * self.dtype.itemsize
+
+    def __len__(self):
+        return len(self.coords)
+
+    # Returns distances between nodes with given (broadcast) arrays of indices.
+    def distances(self, rows, cols):
+        dist = euclidean_distances(self.coords[rows], self.coords[cols], self.decimals)
+        return dist.astype(self.dtype, copy=False)
+
+    # Returns read-only row of distances from node i (from cache if possible).
+    def row(self, i):
+        i = int(i)
+        with self._lock:
+            row = self._rows.get(i)
+            if row is not None:
+                self._rows.move_to_end(i)
+                return row
+        row = self.distances(i, slice(None))
+        row.setflags(write=False)
+        with self._lock:
+            self._rows[i] = row
+            while len(self._rows) > self.cache_rows:
+                self._rows.popitem(last=False)
+        return row
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows, cols = key
+        if isinstance(rows, (int, np.integer)):
+            if isinstance(cols, slice):
+                return self.row(rows)[cols]
+            if isinstance(cols, (int, np.integer)):
+                return self.distances(rows, cols)[()]
+
+        return self.distances(*_index_arrays(rows, cols, len(self)))
+
+    def __setitem__(self, key, value):
+        raise TypeError('DistanceOracle is read-only.')
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+    # Returns dense matrix (used by np.asarray).
+    def __array__(self, dtype = None, copy = None):
+        array = np.empty(self.shape, dtype=self.dtype if dtype is None else dtype)
+        block = max(1, 2 ** 22 // max(1, len(self)))
+        for start in range(0, len(self), block):
+            array[start:start + block] = self[start:start + block]
+        return array
+
+    def copy(self):
+        return np.asarray(self)
+
+    def view(self):
+        return self
+
+    def setflags(self, write):
+        if write:
+            raise ValueError('DistanceOracle is read-only.')
+
+    # Cache and lock aren't pickled (problems are sent to worker processes).
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_rows'] = OrderedDict()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # Returns upper bound of distances : diagonal of bounding box of nodes (rounded as distances),
+    # computed without rows of distances.
+    def max_bound(self):
+        if len(self.coords) == 0:
+            return 0.
+        return float(euclidean_distances(self.coords.min(axis=0), self.coords.max(axis=0), self.decimals))
+
+    # Returns (len(nodes), k) array of k nearest other nodes (from nodes) of every node
+    # of nodes, sorted by distance (nodes with equal distances in order of nodes).
+    # Lists are found with k-d tree and remembered.
+    def nearest(self, nodes, k):
+        nodes = np.asarray(nodes, dtype=np.int64)
+        k = min(k, len(nodes) - 1)
+        if k <= 0:
+            return np.zeros((len(nodes), 0), dtype=np.int64)
+        key = (nodes.tobytes(), k)
+        with self._lock:
+            if key in self._nearest:
+                return self._nearest[key]
+
+        # Distance of k-th nearest other node is at most distance of (k + 1)-th node found
+        # (node itself is usually among them). All nodes with rounded distance not bigger
+        # than rounded bound are candidates, so ties are ordered by positions of nodes,
+        # as by giant_tour.neighbor_lists for dense matrix.
+        points = self.coords[nodes]
+        tree = cKDTree(points)
+        bound, _ = tree.query(points, k + 1)
+        bound = bound[:, -1]
+        if self.decimals is not None:
+            bound = np.round(bound, self.decimals) + 0.5 * 10.0 ** -self.decimals
+        candidates = tree.query_ball_point(points, bound * (1 + 1e-9) + 1e-9, return_sorted=True)
+        result = np.empty((len(nodes), k), dtype=np.int64)
+        for i, found in enumerate(candidates):
+            found = np.asarray(found, dtype=np.int64)
+            found = found[found != i]
+            dist = self.distances(nodes[i], nodes[found])
+            result[i] = nodes[found[np.argsort(dist, kind='stable')[:k]]]
+        result.setflags(write=False)
+        with self._lock:
+            self._nearest[key] = result
+        return result
+
+# Cost matrix with row and column of one node replaced, used by VRPProblem merging many
+# sources into one. Only the replaced row and column are stored, so memory-mapped matrix
+# isn't read into memory and oracle isn't converted to dense matrix.
+# Indexing works as indexing of dense matrix (as in ScaledCosts), the wrapper is read-only.
+# base - cost matrix (array, memmap, ScaledCosts or DistanceOracle)
+# source - index of replaced row and column
+# row, column - costs from source and to source (column wins on their crossing)
+class SourceCosts:
+    def __init__(self, base, source, row, column):
+        self.base = base
+        self.source = int(source)
+        self.row = np.asarray(row)
+        self.column = np.asarray(column)
+        self.row.setflags(write=False)
+        self.column.setflags(write=False)
+        self.dtype = base.dtype
+        self.ndim = 2
+
+    @property
+    def shape(self):
+        return self.base.shape
+
+    @property
+    def nbytes(self):
+        return self.base.nbytes + self.row.nbytes + self.column.nbytes
+
+    def __len__(self):
+        return len(self.base)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows, cols = key
+        source = self.source
+        # Rows and single costs are read in loops over routes, so they are handled first.
+        if isinstance(rows, (int, np.integer)):
+            if isinstance(cols, (int, np.integer)):
+                if cols == source:
+                    return self.column[rows]
+                return self.row[cols] if rows == source else self.base[rows, cols]
+            if isinstance(cols, slice):
+                if rows == source:
+                    values = self.row.copy()
+                    values[source] = self.column[source]
+                    return values[cols]
+                values = self.base[rows]
+                if values[source] != self.column[rows]:
+                    values = np.array(values)
+                    values[source] = self.column[rows]
+                return values[cols]
+
+        values = self.base[rows, cols]
+        rows, cols = _index_arrays(rows, cols, len(self))
+        in_row, in_col = rows == source, cols == source
+        if not in_row.any() and not in_col.any():
+            return values
+        values = np.array(values, dtype=self.dtype)
+        in_row = np.broadcast_to(in_row, values.shape)
+        in_col = np.broadcast_to(in_col, values.shape)
+        values[in_row] = self.row[np.broadcast_to(cols, values.shape)[in_row]]
+        values[in_col] = self.column[np.broadcast_to(rows, values.shape)[in_col]]
+        return values
+
+    def __setitem__(self, key, value):
+        raise TypeError('SourceCosts is read-only.')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    # Returns dense matrix (used by np.asarray).
+    def __array__(self, dtype = None, copy = None):
+        array = np.array(self.base, dtype=self.dtype if dtype is None else dtype)
+        array[self.source] = self.row
+        array[:, self.source] = self.column
+        return array
+
+    def copy(self):
+        return SourceCosts(self.base.copy(), self.source, self.row, self.column)
+
+    def view(self):
+        return SourceCosts(self.base.view(), self.source, self.row, self.column)
+
+    def setflags(self, write):
+        if write:
+            raise ValueError('SourceCosts is read-only.')
+        self.base.setflags(write=False)
+
+    # Returns upper bound of costs as DistanceOracle.max_bound (base should be DistanceOracle).
+    def max_bound(self):
+        return max(self.base.max_bound(), float(self.row.max()), float(self.column.max()))
+
+    # Returns nearest nodes as DistanceOracle.nearest (base should be DistanceOracle).
+    # Lists of other nodes come from base and source is inserted by its replaced costs.
+    def nearest(self, nodes, k):
+        nodes = np.asarray(nodes, dtype=np.int64)
+        at = np.flatnonzero(nodes == self.source)
+        if len(at) == 0:
+            return self.base.nearest(nodes, k)
+        k = min(k, len(nodes) - 1)
+        if k <= 0:
+            return np.zeros((len(nodes), 0), dtype=np.int64)
+
+        position = at[0]
+        others = np.delete(nodes, position)
+        lists = self.base.nearest(others, k)
+        positions = np.full(len(self), -1, dtype=np.int64)
+        positions[nodes] = np.arange(len(nodes))
+
+        # Source goes after nodes closer than it and nodes as close as it preceding it in nodes.
+        dist = self.base.distances(others[:, None], lists)
+        to_source = self.column[others][:, None]
+        insert = np.count_nonzero((dist < to_source) |
+                ((dist == to_source) & (positions[lists] < position)), axis=1)[:, None]
+        before = np.pad(lists, ((0, 0), (0, 1)))
+        after = np.pad(lists, ((0, 0), (1, 0)))
+        columns = np.arange(lists.shape[1] + 1)[None, :]
+        merged = np.where(columns < insert, before, np.where(columns == insert, self.source, after))
+
+        result = np.empty((len(nodes), k), dtype=np.int64)
+        result[np.arange(len(nodes)) != position] = merged[:, :k]
+        result[position] = others[np.argsort(self.row[others], kind='stable')[:k]]
+        result.setflags(write=False)
+        return result
+
+# Returns True if costs are computed on demand by DistanceOracle (with nearest and max_bound methods).
+def is_oracle(costs):
+    if isinstance(costs, SourceCosts):
+        costs = costs.base
+    return isinstance(costs, DistanceOracle)
+
+# Returns costs as object supporting numpy indexing without converting compact matrices.
+# ScaledCosts, DistanceOracle and SourceCosts are returned as they are,
+# other matrices are converted by np.asarray.
+def cost_matrix(costs):
+    if isinstance(costs, (ScaledCosts, DistanceOracle, SourceCosts)):
+        return costs
+    return np.asarray(costs)
+
+# Returns cost matrix stored with given type.
+# dtype - floating type (for example np.float32) or integer type (for example np.int32)
+# scale - for integer types costs are stored as costs * scale, they should be multiples of 1 / scale
+def compact_costs(costs, dtype, scale = 1):
+    dtype = np.dtype(dtype)
+    if isinstance(costs, ScaledCosts) and costs.data.dtype == dtype and costs.scale == scale:
+        return costs
+    costs = np.asarray(costs, dtype=float)
+    if not np.issubdtype(dtype, np.integer):
+        return costs.astype(dtype)
+
+    data = np.rint(costs * scale)
+    info = np.iinfo(dtype)
+    if data.size and (data.min() < info.min or data.max() > info.max):
+        raise ValueError('Costs multiplied by ' + str(scale) + ' don\'t fit in ' + str(dtype) + '.')
+    if not np.allclose(data / scale, costs, rtol=0, atol=1e-6 / scale):
+        raise ValueError('Costs aren\'t multiples of 1/' + str(scale) + '.')
+    return ScaledCosts(data.astype(dtype), scale)
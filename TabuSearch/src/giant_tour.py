@@ -0,0 +1,208 @@
+import numpy as np
+from collections import deque
+from cost_matrix import cost_matrix, is_oracle
+
+# Classical TSP heuristics used to build giant tours for route-first cluster-second solvers.
+# Tour is a list of node ids treated as a cycle (last node is followed by the first one).
+# Local search works only on neighbour lists, so it scales to thousands of nodes.
+
+eps = 1e-9
+
+# Returns dict mapping every node to list of its k nearest nodes (sorted by cost,
+# nodes with equal costs in order of nodes).
+# Rows of the cost matrix are processed in blocks, so only block x len(nodes) submatrix
+# is materialized at once.
+def neighbor_lists(costs, nodes, k, block = 256):
+    costs = cost_matrix(costs)
+    nodes = np.asarray(nodes)
+    k = min(k, len(nodes) - 1)
+    neighbors = dict()
+    if k <= 0:
+        return {int(node): [] for node in nodes}
+    # Oracle finds nearest nodes from coordinates without computing rows of costs.
+    if is_oracle(costs):
+        return dict(zip(nodes.tolist(), costs.nearest(nodes, k).tolist()))
+
+    for start in range(0, len(nodes), block):
+        rows = nodes[start:start + block]
+        sub = np.asarray(costs[rows][:, nodes], dtype=float)
+        sub[np.arange(len(rows)), np.arange(start, start + len(rows))] = np.inf
+        # Nodes with cost equal to k-th cost are ordered by their positions in nodes.
+        kth = np.partition(sub, k - 1, axis=1)[:, k - 1]
+        for r in range(len(rows)):
+            candidates = np.flatnonzero(sub[r] <= kth[r])
+            order = candidates[np.argsort(sub[r][candidates], kind='stable')][:k]
+            neighbors[int(rows[r])] = nodes[order].tolist()
+
+    return neighbors
+
+# Builds tour starting in start node, always going to the nearest unvisited node.
+# Neighbour lists are checked first, full scan is used only if all neighbours are visited.
+def nearest_neighbor_tour(costs, start, nodes, neighbors):
+    costs = cost_matrix(costs)
+    nodes = np.asarray(nodes)
+    index = {int(node): i for i, node in enumerate(nodes)}
+    unvisited = np.ones(len(nodes), dtype=bool)
+    tour = [start]
+    if start in index:
+        unvisited[index[start]] = False
+
+    current = start
+    for _ in range(int(unvisited.sum())):
+        nxt = None
+        for node in neighbors.get(current, []):
+            if node in index and unvisited[index[node]]:
+                nxt = node
+                break
+        if nxt is None:
+            candidates = np.flatnonzero(unvisited)
+            row = costs[current, nodes[candidates]]
+            nxt = int(nodes[candidates[np.argmin(row)]])
+        unvisited[index[nxt]] = False
+        tour.append(nxt)
+        current = nxt
+
+    return tour
+
+# Returns True if cost matrix is symmetric. 2-opt is used only for symmetric costs,
+# because reversing part of tour changes its cost otherwise.
+# Matrix is compared in blocks of rows, so compact matrices aren't converted at once.
+def is_symmetric(costs, block = 256):
+    costs = cost_matrix(costs)
+    n = costs.shape[0]
+    if n != costs.shape[1]:
+        return False
+    for start in range(0, n, block):
+        rows = np.arange(start, min(start + block, n))
+        if not np.array_equal(costs[rows], costs[:, rows].T):
+            return False
+    return True
+
+# Returns total cost of a cyclic tour.
+def tour_cost(tour, costs):
+    tour = np.asarray(tour)
+    return float(cost_matrix(costs)[tour, np.roll(tour, -1)].sum())
+
+# Improves tour in place with 2-opt and Or-opt moves restricted to neighbour lists.
+# Only nodes from active (all nodes by default) are examined first, nodes touched
+# by improving moves are examined again (don't look bits).
+# two_opt - False for asymmetric costs.
+# Returns improved tour.
+def improve_tour(tour, costs, neighbors, active = None, two_opt = True, max_segment = 3):
+    costs = cost_matrix(costs)
+    n = len(tour)
+    if n < 4:
+        return tour
+
+    pos = {node: i for i, node in enumerate(tour)}
+    queue = deque(tour if active is None else active)
+    queued = set(queue)
+
+    # Costs are read as python floats, so sums of float32 costs are exact enough for eps.
+    def cost(a, b):
+        return float(costs[a, b])
+
+    def succ(node):
+        return tour[(pos[node] + 1) % n]
+
+    def pred(node):
+        return tour[pos[node] - 1]
+
+    def activate(*nodes):
+        for node in nodes:
+            if node not in queued:
+                queued.add(node)
+                queue.append(node)
+
+    def reverse(i, j):
+        tour[i:j + 1] = tour[i:j + 1][::-1]
+        for k in range(i, j + 1):
+            pos[tour[k]] = k
+
+    # 2-opt move replacing edges (a, succ(a)) and (c, succ(c)) with (a, c) and (succ(a), succ(c)).
+    def try_two_opt(a):
+        b = succ(a)
+        ab = cost(a, b)
+        for c in neighbors.get(a, []):
+            ac = cost(a, c)
+            if ac >= ab - eps:
+                break
+            d = succ(c)
+            if c == b or d == a:
+                continue
+            delta = ac + cost(b, d) - ab - cost(c, d)
+            if delta < -eps:
+                i, j = pos[a], pos[c]
+                if i < j:
+                    reverse(i + 1, j)
+                else:
+                    reverse(j + 1, i)
+                activate(a, b, c, d)
+                return True
+        return False
+
+    # Or-opt move of segment of length 1..max_segment starting in s
+    # between neighbour c of s and its successor (without reversing the segment).
+    def try_or_opt(s):
+        for length in range(1, max_segment + 1):
+            i = pos[s]
+            if i + length > n:
+                # Segment would wrap around the end of the list.
+                return False
+            segment = tour[i:i + length]
+            e = segment[-1]
+            p = pred(s)
+            nx = succ(e)
+            if nx == s or p == e or nx == p:
+                return False
+            removed = cost(p, s) + cost(e, nx) - cost(p, nx)
+            inside = set(segment)
+            for c in neighbors.get(s, []):
+                if cost(c, s) >= removed - eps:
+                    break
+                if c in inside or c == p:
+                    continue
+                d = succ(c)
+                if d in inside:
+                    continue
+                delta = cost(c, s) + cost(e, d) - cost(c, d) - removed
+                if delta < -eps:
+                    del tour[i:i + length]
+                    j = tour.index(c) + 1
+                    tour[j:j] = segment
+                    lo = min(i, j)
+                    for k in range(lo, n):
+                        pos[tour[k]] = k
+                    activate(p, nx, c, d, s, e)
+                    return True
+        return False
+
+    while queue:
+        node = queue.popleft()
+        queued.discard(node)
+        if two_opt and try_two_opt(node):
+            continue
+        if try_or_opt(node):
+            continue
+
+    return tour
+
+# Perturbs tour with double bridge move applied to a random window of the tour.
+# Returns new tour and list of nodes adjacent to changed edges.
+def double_bridge(tour, rng, window = 100):
+    n = len(tour)
+    if n < 8:
+        return list(tour), list(tour)
+
+    window = min(window, n - 1)
+    start = int(rng.integers(0, n - window))
+    cuts = sorted(rng.choice(np.arange(start + 1, start + window + 1), 3, replace=False).tolist())
+    a, b, c = cuts
+    new_tour = tour[:a] + tour[b:c] + tour[a:b] + tour[c:]
+    touched = [tour[a - 1], tour[a], tour[b - 1], tour[b], tour[c - 1], tour[c % n]]
+    return new_tour, touched
+
+# Returns tour rotated so that it starts in given node.
+def rotate_to(tour, node):
+    i = tour.index(node)
+    return tour[i:] + tour[:i]
@@ -3,6 +3,9 @@ import csv
 import math
 from itertools import product
 from vrp_problem import VRPProblem
+from instance_reader import read_instance
+import instance_cache
+from shortest_paths import shortest_path_costs
 import numpy as np
 
 # Creates directed graph from file.
@@ -25,55 +28,26 @@ def create_graph_from_csv(path):
 # path - path to test file
 # graph_path - path to graph file
 # capacity - True if vehicles have capacities, False otherwise
-def read_full_test(path, graph_path, capacity = True):
-    graph = create_graph_from_csv(graph_path)
-    in_file = open(path, 'r')
-    
-    nodes_id = list()
-
-    # Reading magazines.
-    next(in_file)
-    nodes_id = [int(s) for s in in_file.readline().split() if s.isdigit()]
-    magazines_num = len(nodes_id)
-
-    # Reading destinations.
-    dests_num = int(in_file.readline())
-    nodes_num = dests_num + magazines_num
+# workers - number of processes computing shortest paths (None - computed in this process)
+# Problem is memory-mapped from instance_cache if it is enabled.
+def read_full_test(path, graph_path, capacity = True, workers = None):
+    build = lambda: (_read_full_test(path, graph_path, capacity, workers), dict())
+    parameters = {'reader' : 'full_test', 'capacity' : capacity}
+    return instance_cache.load([path, graph_path], build, parameters)[0]
+
+def _read_full_test(path, graph_path, capacity, workers):
+    instance = read_instance(path, 'graph-test')
+    nodes_num = len(instance.node_ids)
+    magazines_num = len(instance.sources)
 
     weights = np.zeros((nodes_num), dtype=int)
-    for i in range(dests_num):
-        order = in_file.readline().split()
-        
-        dest = int(order[0])
-        nodes_id.append(dest)
-
-        if capacity:
-            weight = int(order[1])
-            weights[i + magazines_num] = weight
-
-    # Reading vehicles.
-    vehicles = int(in_file.readline())
-    capacities = np.ones((vehicles), dtype=int)
-
+    capacities = np.ones((instance.vehicles), dtype=int)
     if capacity:
-        capacities = [int(s) for s in in_file.readline().split() if s.isdigit()]
-
-    # Generating costs matrix.
-    costs = np.zeros((nodes_num, nodes_num), dtype=int)
-    for i in range(nodes_num):
-        source = nodes_id[i]
-        _, paths = nx.single_source_dijkstra(graph, source, weight = 'cost')
-        for j in range(nodes_num):
-            d = nodes_id[j]
-            path = paths[d]
-        
-            prev = source
-            for node in path[1:]:
-                edge = graph.get_edge_data(prev, node)
-                costs[i][j] += edge['cost']
-                prev = node
-
-    in_file.close()
+        weights = instance.demands
+        capacities = instance.capacities
+
+    # Costs matrix from lengths of shortest paths (truncated to integers).
+    costs = shortest_path_costs(graph_path, instance.node_ids, workers).astype(int)
 
     sources = [i for i in range(magazines_num)]
     dests =  [i for i in range(magazines_num, nodes_num)]
@@ -83,37 +57,27 @@ def read_full_test(path, graph_path, capacity = True):
 # Creates VRPProblem from test file.
 # path - path to test file
 # capacity - True if vehicles have capacities, False otherwise
+# Problem is memory-mapped from instance_cache if it is enabled.
 def read_test(path, capacity = True):
-    in_file = open(path, 'r')
-    
-    magazines_num = int(in_file.readline())
-    dests_num = int(in_file.readline())
-    nodes_num = magazines_num + dests_num
+    build = lambda: (_read_test(path, capacity), dict())
+    parameters = {'reader' : 'test', 'capacity' : capacity}
+    return instance_cache.load([path], build, parameters)[0]
+
+def _read_test(path, capacity):
+    instance = read_instance(path, 'test')
+    nodes_num = len(instance.demands)
+    magazines_num = len(instance.sources)
 
-    # Reading weights of destinations.
     weights = np.zeros((nodes_num), dtype=int)
+    capacities = np.ones((instance.vehicles), dtype=int)
     if capacity:
-        w = [int(s) for s in in_file.readline().split() if s.isdigit()]
-        for i in range(dests_num):
-            weights[i + magazines_num] = w[i]
-
-    # Reading costs.
-    costs = np.zeros((nodes_num, nodes_num), dtype=int)
-    for i in range(nodes_num):
-        costs[i] = [int(s) for s in in_file.readline().split() if s.isdigit()]
-
-    # Reading vehicles.
-    vehicles = int(in_file.readline())
-    capacities = np.ones((vehicles), dtype=int)
-    if capacity:
-        capacities = [int(s) for s in in_file.readline().split() if s.isdigit()]
-
-    in_file.close()
+        weights = instance.demands
+        capacities = instance.capacities
 
     sources = [i for i in range(magazines_num)]
     dests =  [i for i in range(magazines_num, nodes_num)]
 
-    return VRPProblem(sources, costs, capacities, dests, weights) 
+    return VRPProblem(sources, instance.costs, capacities, dests, weights) 
 
 # Creates one-file test from format with graph.
 # in_path - test input file
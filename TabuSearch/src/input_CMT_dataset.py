@@ -1,121 +1,72 @@
 import networkx as nx
 import numpy as np
 import matplotlib.pyplot as plt
-import math
 from itertools import product
 from vrp_problem import VRPProblem
-
+from instance_reader import read_instance
+import instance_cache
+from cost_matrix import ScaledCosts, DistanceOracle, euclidean_distances
+
+# Returns dict with (ready time, due time) pair for every node of instance (keys are strings).
+def _time_intervals(instance):
+    ids = [str(i) for i in range(len(instance.demands))]
+    return dict(zip(ids, zip(instance.ready.astype(int).tolist(), instance.due.astype(int).tolist())))
+
+# Returns dict with data of instance (keys of nodes are strings with their ids).
+def _instance_data(instance):
+    ids = [str(i) for i in range(len(instance.demands))]
+    return {
+        "capacity" : instance.capacity,
+        "vehicleNumber" : instance.vehicles,
+        "node_coords" : dict(zip(ids, map(tuple, instance.coords.tolist()))),
+        "demands" : dict(zip(ids, instance.demands.tolist())),
+        "time_interval" : _time_intervals(instance),
+        "service" : int(instance.service.max()) if len(instance.service) else 0,
+        "depot" : [0.0],
+    }
+
+# Parses file in Solomon format. Use read_instance to get arrays instead of dicts.
 def parse_file_time(file_path):
-    data = {}
-    current_section = None
-
-
-    with open(file_path, "r") as file:
-        iterator = iter(file)
-        for line in iterator:
-            line = line.strip()
-            
-            if line.startswith("NUMBER"):
-                try:
-                    next_line = next(iterator).strip()
-                    vehicle_number, capacity = next_line.split(maxsplit=1)
-                    data["capacity"] = int(capacity)
-                    data["vehicleNumber"] = int(vehicle_number)
-                except StopIteration:
-                    print("End of file reached unexpectedly after 'NUMBER'.")
-                except ValueError:
-                    print("Error processing vehicle number and capacity.")
-            elif line.startswith("CUST NO."):
-                current_section = "data_section"
-                data["node_coords"] = {}
-                data['demands'] = {}
-                data['time_interval'] = {}
-
-
-            if current_section == "data_section" and line and not line.startswith("NUMBER") and not line.startswith("CUST NO."):
-                try:
-                    cust_no, x_coord, y_coord, demand, ready_time, due_date, service = line.split(maxsplit=7)
-                    data["service"] = int(service)
-                    cust_no = str(int(cust_no))
-                    data["node_coords"][cust_no] = (float(x_coord), float(y_coord))
-                    data["demands"][cust_no] = int(demand)
-                    data["depot"] = [0.0]
-                    #vehicle cannot begin before ready_time and has to start before or at due_date
-                    data["time_interval"][cust_no] = (int(ready_time), int(due_date))                    
-                except ValueError:
-                    print(f"Error processing customer data for line: {line}")
-
-    return data
+    return _instance_data(read_instance(file_path, 'solomon'))
 
+# Parses file in TSPLIB format. Use read_instance to get arrays instead of dicts.
 def parse_file(file_path):
-    data = {}
-    current_section = None
-
-
-    with open(file_path, "r") as file:
-        iterator = iter(file)
-        for line in iterator:
-            line = line.strip()
-            
-            if line.startswith("CAPACITY"):
-                try:
-                    capacity = line.split(" : ")[1]
-                    data["capacity"] = int(capacity)
-                    data["vehicleNumber"] = int(6)
-                except StopIteration:
-                    print("End of file reached unexpectedly after 'NUMBER'.")
-                except ValueError:
-                    print("Error processing vehicle number and capacity.")
-            elif line.startswith("NODE_COORD_SECTION"):
-                current_section = "coord_section"
-                data["node_coords"] = {}
-                data['time_interval'] = {}
-            elif line.startswith("DEMAND_SECTION"):
-                current_section = "demand_section"
-                data['demands'] = {}
-            else:
-                current_section == "ignore"
-            
-
-
-            if current_section == "coord_section" and line:
-                try:
-                    cust_no, x_coord, y_coord = line.split(maxsplit=3)
-                    cust_no = str(int(cust_no) - 1)
-                    data["service"] = int(0)
-                    data["node_coords"][cust_no] = (float(x_coord), float(y_coord))
-                    data["depot"] = [0.0]
-                    #vehicle cannot begin before ready_time and has to start before or at due_date
-                    data["time_interval"][cust_no] = (int(0), int(0))                    
-                except ValueError:
-                    print(f"Error processing customer data for line: {line}")
-            elif current_section == "demand_section" and line:
-                try:
-                    cust_no, demand = line.split(maxsplit=2)
-                    cust_no = str(int(cust_no) - 1)
-                    data["demands"][cust_no] = int(demand)
-                except ValueError:
-                    print("ignore")
-    return data
-
-
-
-
-
-    
-
-
-
-
-
-
-
+    return _instance_data(read_instance(file_path, 'tsplib'))
+
+# Returns matrix of euclidean distances between rows of coords.
+# Distances are computed in blocks of rows, so temporary arrays stay small for big instances.
+# dtype - type of returned matrix. For integer types (for example np.int32) distances
+# multiplied by 10^decimals are stored in cost_matrix.ScaledCosts.
+# decimals - number of decimals distances are rounded to (None - no rounding)
+# block - number of rows computed at once (None - chosen by size of instance)
+def distance_matrix(coords, dtype = float, decimals = 1, block = None):
+    coords = np.asarray(coords, dtype=float)
+    n = len(coords)
+    if block is None:
+        block = max(1, 2 ** 22 // max(n, 1))
+    scaled = np.issubdtype(np.dtype(dtype), np.integer)
+    scale = 10 ** (decimals or 0)
+    costs = np.empty((n, n), dtype=dtype)
+    for start in range(0, n, block):
+        dist = euclidean_distances(coords[start:start + block, None, :], coords[None, :, :], decimals)
+        costs[start:start + block] = np.rint(dist * scale) if scaled else dist
+    return ScaledCosts(costs, scale) if scaled else costs
+
+# Returns networkx graph with nodes having 'pos' attributes given by (n, 2) array of coordinates.
+# Graph is needed only for plotting, so problems are created with coordinates only.
+def coordinates_graph(coords):
+    if isinstance(coords, nx.Graph):
+        return coords
+    g = nx.Graph()
+    g.add_nodes_from((str(i), {"pos" : (x, y)}) for i, (x, y) in enumerate(np.asarray(coords).tolist()))
+    return g
 
+# g - graph or array of coordinates returned by create_vrp_problem.
 def plot_all_solutions(g, solutions, t):
     """Plots all solutions on a single graph, with nodes and paths."""
 
+    g = coordinates_graph(g)
     node_positions = nx.get_node_attributes(g, "pos")
-
     plt.figure(figsize=(8, 6))  
 
     for i, node in enumerate(g.nodes):
@@ -161,94 +112,41 @@ def plot_all_solutions(g, solutions, t):
     plt.savefig('outputs/images/' + t + '.png')
 
 
-def create_vrp_problem(dataset_file):
-    parsed_data = parse_file(dataset_file)
-    capacity = int(parsed_data["capacity"])
-    numOfVehicles = int(parsed_data["vehicleNumber"])
-    demands = parsed_data["demands"]
-    time_intervals = parsed_data["time_interval"]
-    weights = list(demands.values())
-    weights = np.array((weights), dtype=int)
-    capacities = [capacity] * numOfVehicles
-    service = int(parsed_data["service"])   
-    services = [service]
-    dests = list(demands.keys())
-    dests = [int(dest) for dest in dests]
-    sources = [int(dests.pop(0))]
-    node_coords = parsed_data["node_coords"] 
-
-    g = nx.Graph()
-    for node_id, (x, y) in parsed_data["node_coords"].items():
-        g.add_node(node_id, pos=(x, y))
-
-    num_nodes = len(g.nodes)
-    costs = np.zeros((num_nodes, num_nodes), dtype=float)
-
-    node_list = list(g.nodes)
-    for i, node1 in enumerate(node_list):
-        for j, node2 in enumerate(node_list):
-            if node1 != node2:
-                dist = math.sqrt((g.nodes[node1]["pos"][0] - g.nodes[node2]["pos"][0])**2 +
-                                 (g.nodes[node1]["pos"][1] - g.nodes[node2]["pos"][1])**2)
-                costs[i][j] = dist
-
-    costs = np.round(costs, 1)
-    print("Sources:\n", sources)
-    print("Cost Matrix:\n", costs)
-    print("Capacities:\n", capacities)
-    print("Destination nodes:\n", dests)
-    print("Weights:\n", weights)
-    print("Time Intervals:\n", time_intervals)
-
-    return VRPProblem(sources, costs, capacities, dests, weights, time_intervals, services, node_coords), g
+# Creates VRPProblem from instance. Returns problem and (n, 2) array of coordinates of nodes.
+def _coordinates_problem(instance, dtype = float, decimals = 1, oracle = False):
+    n = len(instance.demands)
+    time_intervals = _time_intervals(instance)
+    services = [int(instance.service.max()) if n else 0]
+    if oracle:
+        costs = DistanceOracle(instance.coords, decimals, dtype)
+    else:
+        costs = distance_matrix(instance.coords, dtype, decimals)
+
+    problem = VRPProblem(instance.sources.tolist(), costs, instance.capacities,
+            instance.dests().tolist(), instance.demands,
+            time_intervals = time_intervals, services = services)
+    return problem, instance.coords
+
+# Returns VRPProblem created from file with coordinates of nodes (TSPLIB or Solomon format)
+# and array of coordinates of nodes (it can be passed to plot_all_solutions).
+# Problem is memory-mapped from instance_cache if it is enabled.
+# dtype, decimals - type and rounding of cost matrix (see distance_matrix)
+# oracle - if True, costs are computed on demand by cost_matrix.DistanceOracle instead of
+# dense matrix (dtype should be floating), so big instances fit in memory
+def create_vrp_problem(dataset_file, dtype = float, decimals = 1, oracle = False):
+    def build():
+        problem, coords = _coordinates_problem(read_instance(dataset_file), dtype, decimals, oracle)
+        return problem, {"coords" : coords}
+
+    parameters = {"reader" : "coordinates", "dtype" : np.dtype(dtype).str, "decimals" : decimals,
+            "oracle" : oracle}
+    problem, extras = instance_cache.load([dataset_file], build, parameters)
+    return problem, extras["coords"]
 
 
 #with time
-def create_vrp_problem_time(dataset_file):
-    parsed_data = parse_file_time(dataset_file)
-    capacity = int(parsed_data["capacity"])
-    numOfVehicles = int(parsed_data["vehicleNumber"])
-    demands = parsed_data["demands"]
-    time_intervals = parsed_data["time_interval"]
-    weights = list(demands.values())
-    weights = np.array((weights), dtype=int)
-    capacities = [capacity] * numOfVehicles
-    service = int(parsed_data["service"])   
-    services = [service]
-    dests = list(demands.keys())
-    dests = [int(dest) for dest in dests]
-    sources = [int(dests.pop(0))]
-    node_coords = parsed_data["node_coords"] 
-
-    g = nx.Graph()
-    for node_id, (x, y) in parsed_data["node_coords"].items():
-        g.add_node(node_id, pos=(x, y))
-
-    num_nodes = len(g.nodes)
-    costs = np.zeros((num_nodes, num_nodes), dtype=float)
-
-    node_list = list(g.nodes)
-    for i, node1 in enumerate(node_list):
-        for j, node2 in enumerate(node_list):
-            if node1 != node2:
-                dist = math.sqrt((g.nodes[node1]["pos"][0] - g.nodes[node2]["pos"][0])**2 +
-                                 (g.nodes[node1]["pos"][1] - g.nodes[node2]["pos"][1])**2)
-                costs[i][j] = dist
-
-    costs = np.round(costs, 1)
-    print("Sources:\n", sources)
-    print("Cost Matrix:\n", costs)
-    print("Capacities:\n", capacities)
-    print("Destination nodes:\n", dests)
-    print("Weights:\n", weights)
-    print("Services:\n", services)
-    print("Time Intervals:\n", time_intervals)
-    # print("TIME TEST: ", time_intervals['-1'][0])
-    # print(f'cost0,1 {costs[0][1]}, cost1,2 {costs[1][2]}, cost2,4 {costs[2][4]}, cost4,3 {costs[4][3]}, cost3,5 {costs[3][5]}, cost5,0 {costs[5][0]}, ')
-
-
-
-    return VRPProblem(sources, costs, capacities, dests, weights, time_intervals, services, node_coords), g
+def create_vrp_problem_time(dataset_file, dtype = float, decimals = 1, oracle = False):
+    return create_vrp_problem(dataset_file, dtype, decimals, oracle)
 
 # # Example usage:
 # problem, graph = create_vrp_problem(r"C:\Users\darre\Desktop\Quantum Research\DBCW\D-Wave-VRP-master_Time\D-Wave-VRP-master\tests\CMT\CMT1.vrp")
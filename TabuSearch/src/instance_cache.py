@@ -0,0 +1,76 @@
+# Optional on-disk cache of problems created from instance files.
+# Problem created from text file (with its cost matrix) is stored in compiled problem file
+# (format of shared_problem) named by hash of content of source files and parameters of reading.
+# Fresh entry is memory-mapped instead of parsing file and building cost matrix again,
+# so many processes reading the same instance share one copy of cost matrix in page cache.
+# Cache is disabled by default. It is enabled by enable(directory)
+# or by VRP_INSTANCE_CACHE environment variable with path of cache directory.
+
+import hashlib
+import json
+import os
+import uuid
+from shared_problem import SharedProblem, open_problem_arrays, open_problem_file, read_problem_header
+
+_version = 1
+_directory = os.environ.get('VRP_INSTANCE_CACHE') or None
+
+# Enables cache in given directory (it is created if needed).
+def enable(directory):
+    global _directory
+    os.makedirs(directory, exist_ok=True)
+    _directory = directory
+
+def disable():
+    global _directory
+    _directory = None
+
+# Returns directory of cache or None if cache is disabled.
+def directory():
+    return _directory
+
+# Returns hex hash of content of files and parameters of reading.
+def content_hash(paths, parameters):
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'version' : _version, 'parameters' : parameters}, sort_keys=True).encode())
+    for path in paths:
+        with open(path, 'rb') as in_file:
+            for block in iter(lambda: in_file.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+# Returns pair (problem, extras) for instance given by source files.
+# If cache is enabled and has fresh entry, problem and extras are memory-mapped from it.
+# Otherwise they are created by build and stored in cache.
+# paths - source files of instance (the first one names entry)
+# build - function returning pair (problem, extras), where extras is dict of arrays
+# parameters - JSON-serializable parameters of build, part of hash
+def load(paths, build, parameters = None):
+    if _directory is None:
+        return build()
+
+    key = content_hash(paths, parameters)
+    path = os.path.join(_directory, os.path.basename(paths[0]) + '-' + key[:16] + '.vrpc')
+    try:
+        info = read_problem_header(path)['info']
+        if info['hash'] == key:
+            return open_problem_file(path), open_problem_arrays(path, info['extras'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    problem, extras = build()
+    # Entry is written in temporary file and renamed, so concurrent jobs never see
+    # partially written entry.
+    # It is created with permissions of normal files (umask is applied by system).
+    tmp = os.path.join(_directory, '.tmp-' + uuid.uuid4().hex)
+    try:
+        os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+        SharedProblem(problem, tmp, keep_file=True, extras=extras,
+                info={'hash' : key, 'extras' : list(extras)}).close()
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return problem, extras
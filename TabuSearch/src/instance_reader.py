@@ -0,0 +1,221 @@
+# Reading of VRP instances from text files in all formats used by tests :
+# 'tsplib' - CVRP files with NODE_COORD_SECTION and DEMAND_SECTION (CMT, Augerat, ...)
+# 'solomon' - VRPTW files with VEHICLE and CUSTOMER tables (Solomon, Gehring-Homberger)
+# 'test' - .test files with cost matrix (see input.read_test)
+# 'graph-test' - .test files with ids of nodes of separate graph (see input.read_full_test)
+# Sections are parsed at once with np.fromstring, so reading doesn't create
+# python objects for every line and big instances are read in milliseconds.
+
+import math
+import re
+import numpy as np
+
+_section = re.compile(r'^[ \t]*([A-Z_]+_SECTION|EOF)[ \t]*:?[ \t]*$', re.M)
+_header = re.compile(r'^[ \t]*([A-Z_]+)[ \t]*:[ \t]*(.*?)[ \t]*$', re.M)
+_vehicles_in_name = re.compile(r'-k(\d+)', re.I)
+
+# Instance read from file. Nodes are indexed from 0, in order of their ids.
+# Attributes :
+# name - name of instance (None if file has no name)
+# format - format of file
+# coords - (n, 2) array of coordinates of nodes (None if file has cost matrix or graph)
+# costs - (n, n) cost matrix ('test' format, None otherwise)
+# node_ids - ids of nodes in graph ('graph-test' format, None otherwise)
+# sources - array of indices of magazines
+# demands - array of demands of nodes (zeros if file has no demands)
+# ready, due, service - arrays of ready times, due times and service times of nodes
+# (zeros if file has no time windows)
+# capacities - array of capacities of vehicles
+# capacity - capacity of the biggest vehicle
+# vehicles - number of vehicles
+# time_windows - True if file has time windows
+class Instance:
+    def __init__(self, name, format, sources, demands, capacities, coords = None, costs = None,
+            node_ids = None, ready = None, due = None, service = None):
+        n = len(demands)
+        self.name = name
+        self.format = format
+        self.coords = coords
+        self.costs = costs
+        self.node_ids = node_ids
+        self.sources = np.asarray(sources, dtype=np.int64)
+        self.demands = np.asarray(demands, dtype=np.int64)
+        self.time_windows = ready is not None
+        self.ready = ready if ready is not None else np.zeros(n)
+        self.due = due if due is not None else np.zeros(n)
+        self.service = service if service is not None else np.zeros(n)
+        self.capacities = np.asarray(capacities, dtype=np.int64)
+        self.capacity = int(self.capacities.max()) if len(self.capacities) else 0
+        self.vehicles = len(self.capacities)
+
+    # Returns array of indices of destinations (all nodes except magazines).
+    def dests(self):
+        dests = np.ones(len(self.demands), dtype=bool)
+        dests[self.sources] = False
+        return np.flatnonzero(dests)
+
+# Returns array of numbers from text (whitespace separated).
+def _numbers(text, dtype = float):
+    if not text.strip():
+        return np.zeros(0, dtype=dtype)
+    return np.fromstring(text, dtype=dtype, sep=' ')
+
+# Returns rows of table with ids in the first column, sorted by ids,
+# and ids shifted by given base.
+def _table(text, columns, base):
+    values = _numbers(text)
+    if len(values) % columns != 0:
+        raise ValueError('Section should have ' + str(columns) + ' columns.')
+    values = values.reshape(-1, columns)
+    ids = values[:, 0].astype(np.int64) - base
+    order = np.argsort(ids, kind='stable')
+    if not np.array_equal(ids[order], np.arange(len(ids))):
+        raise ValueError('Ids of nodes should be consecutive.')
+    return values[order, 1:]
+
+# Returns format of instance given by its text.
+def detect_format(text):
+    if 'NODE_COORD_SECTION' in text or 'EDGE_WEIGHT_TYPE' in text:
+        return 'tsplib'
+    if 'CUST NO.' in text:
+        return 'solomon'
+    # 'graph-test' files start with path of graph, which isn't a number.
+    try:
+        numbers = _numbers(text)
+    except ValueError:
+        return 'graph-test'
+    if _test_layout(numbers) is not None:
+        return 'test'
+    return 'graph-test'
+
+def _read_tsplib(text):
+    headers = dict()
+    sections = dict()
+    matches = list(_section.finditer(text))
+    for match in _header.finditer(text[:matches[0].start()] if matches else text):
+        headers[match.group(1)] = match.group(2)
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following is not None else len(text)
+        sections[match.group(1)] = text[match.end():end]
+
+    if 'NODE_COORD_SECTION' not in sections:
+        raise ValueError('TSPLIB file without NODE_COORD_SECTION is not supported.')
+    coords = _table(sections['NODE_COORD_SECTION'], 3, 1)
+    n = len(coords)
+    demands = np.zeros(n)
+    if 'DEMAND_SECTION' in sections:
+        demands = _table(sections['DEMAND_SECTION'], 2, 1)[:, 0]
+    sources = np.array([0])
+    if 'DEPOT_SECTION' in sections:
+        depots = _numbers(sections['DEPOT_SECTION'], np.int64)
+        depots = depots[depots > 0] - 1
+        if len(depots) != 0:
+            sources = depots
+
+    name = headers.get('NAME')
+    capacity = int(float(headers.get('CAPACITY', 0)))
+    # Number of vehicles is given in header, in name (for example A-n32-k5) or it is
+    # the smallest number of vehicles having enough capacity.
+    if 'VEHICLES' in headers:
+        vehicles = int(headers['VEHICLES'])
+    elif name is not None and _vehicles_in_name.search(name):
+        vehicles = int(_vehicles_in_name.search(name).group(1))
+    elif capacity > 0:
+        vehicles = max(1, math.ceil(demands.sum() / capacity))
+    else:
+        vehicles = 1
+
+    return Instance(name, 'tsplib', sources, demands, [capacity] * vehicles, coords = coords)
+
+def _read_solomon(text):
+    lines = text.splitlines()
+    name = lines[0].strip() if lines and lines[0].strip() else None
+    table_start = text.index('CUST NO.')
+    vehicles, capacity = 0, 0
+    fleet = re.search(r'NUMBER[^\n]*\n\s*(\d+)\s+(\d+)', text[:table_start])
+    if fleet is not None:
+        vehicles, capacity = int(fleet.group(1)), int(fleet.group(2))
+
+    customers = _table(text[text.index('\n', table_start) + 1:], 7, 0)
+    coords = np.ascontiguousarray(customers[:, 0:2])
+    demands = customers[:, 2]
+    ready = np.ascontiguousarray(customers[:, 3])
+    due = np.ascontiguousarray(customers[:, 4])
+    service = np.ascontiguousarray(customers[:, 5])
+    return Instance(name, 'solomon', [0], demands, [capacity] * vehicles, coords = coords,
+            ready = ready, due = due, service = service)
+
+# Returns layout (magazines, dests, has_weights) of numbers of 'test' file
+# or None if they aren't 'test' file.
+def _test_layout(numbers):
+    if len(numbers) < 2:
+        return None
+    magazines, dests = int(numbers[0]), int(numbers[1])
+    nodes = magazines + dests
+    if magazines < 0 or dests < 0 or magazines != numbers[0] or dests != numbers[1]:
+        return None
+    for has_weights in (True, False):
+        vehicles_at = 2 + (dests if has_weights else 0) + nodes * nodes
+        if vehicles_at >= len(numbers):
+            continue
+        vehicles = int(numbers[vehicles_at])
+        if vehicles_at + 1 + (vehicles if has_weights else 0) == len(numbers):
+            return magazines, dests, has_weights
+    return None
+
+def _read_test(text):
+    numbers = _numbers(text)
+    layout = _test_layout(numbers)
+    if layout is None:
+        raise ValueError('Wrong format of test file.')
+    magazines, dests, has_weights = layout
+    nodes = magazines + dests
+
+    position = 2
+    demands = np.zeros(nodes)
+    if has_weights:
+        demands[magazines:] = numbers[position:position + dests]
+        position += dests
+    costs = numbers[position:position + nodes * nodes].reshape(nodes, nodes)
+    if np.array_equal(costs, np.round(costs)):
+        costs = costs.astype(np.int64)
+    position += nodes * nodes
+    vehicles = int(numbers[position])
+    capacities = numbers[position + 1:] if has_weights else np.ones(vehicles)
+    return Instance(None, 'test', np.arange(magazines), demands, capacities, costs = costs)
+
+def _read_graph_test(text):
+    lines = [line for line in text.splitlines() if line.strip()]
+    magazines = _numbers(lines[1], np.int64)
+    dests = int(lines[2])
+    orders = _numbers('\n'.join(lines[3:3 + dests]))
+    orders = orders.reshape(dests, -1)
+    vehicles = int(lines[3 + dests])
+
+    node_ids = np.concatenate([magazines, orders[:, 0].astype(np.int64)])
+    demands = np.zeros(len(node_ids))
+    capacities = np.ones(vehicles)
+    if orders.shape[1] > 1:
+        demands[len(magazines):] = orders[:, 1]
+        if len(lines) > 4 + dests:
+            capacities = _numbers(lines[4 + dests])
+    return Instance(None, 'graph-test', np.arange(len(magazines)), demands, capacities,
+            node_ids = node_ids)
+
+_readers = {
+    'tsplib' : _read_tsplib,
+    'solomon' : _read_solomon,
+    'test' : _read_test,
+    'graph-test' : _read_graph_test,
+}
+
+# Returns Instance read from file.
+# format - one of 'tsplib', 'solomon', 'test', 'graph-test' (None - detected from content)
+def read_instance(path, format = None):
+    with open(path, 'r') as in_file:
+        text = in_file.read()
+    if format is None:
+        format = detect_format(text)
+    if format not in _readers:
+        raise ValueError('Unknown format ' + str(format) + '.')
+    return _readers[format](text)
@@ -0,0 +1,79 @@
+import numpy as np
+
+# Calibration of constants of VRP qubos (only_one_const and order_const).
+# Objective terms of variable (step, dest) are costs of travel into dest and out of it,
+# so removing one destination from correct solution lowers objective at most by
+# max_in[dest] + max_out[dest]. If its step is taken by source (vehicle waits there),
+# only the one-hot constraint of the destination is broken, which costs only_one_const.
+# So only_one_const bigger than the biggest sum of max_in and max_out (by order_const)
+# makes every single violation unprofitable while keeping penalties close to route costs.
+
+# Returns pair (only_one_const, order_const) calculated from costs of problem.
+# factor - multiplier of the biggest sum of max_in and max_out.
+def calibrate_penalties(problem, factor = 1.):
+    nodes = list(problem.dests) + [problem.source]
+    if len(problem.dests) == 0:
+        return 1., 1.
+    costs = np.array(problem.costs[np.ix_(nodes, nodes)], dtype=float)
+    np.fill_diagonal(costs, -np.inf)
+    dests = len(problem.dests)
+    max_in = np.max(costs, axis=0)[:dests]
+    max_out = np.max(costs, axis=1)[:dests]
+    bound = np.max(np.maximum(max_in, 0) + np.maximum(max_out, 0)) if len(nodes) > 1 else 0.
+    order_const = 1.
+    return max(factor * float(bound), 0.) + order_const, order_const
+
+# Returns fraction of samples of qubo with given vehicle limits (as in VRPSolution)
+# breaking one-hot constraints : every destination in exactly one step
+# and exactly one node in every step.
+# samples - vector or array samples x variables, in any integer type (it isn't copied).
+# variables - indices of variables of columns of samples in qubo, other variables
+# are 0 (None - columns are all variables).
+def invalid_fraction(problem, samples, vehicle_limits, variables = None):
+    table = problem.get_step_index(sum(vehicle_limits))
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples[None, :]
+    if variables is None:
+        variables = np.arange(samples.shape[1])
+    variables = np.asarray(variables, dtype=np.int64)
+    used = variables < table.size
+    steps, nodes = np.divmod(variables, len(table.nodes))
+
+    # Sums are computed over columns of one constraint at once, so only they are copied.
+    valid = np.ones(len(samples), dtype=bool)
+    for step in range(table.steps):
+        valid &= samples[:, used & (steps == step)].sum(axis=1) == 1
+    for dest in range(len(problem.dests)):
+        valid &= samples[:, used & (nodes == dest)].sum(axis=1) == 1
+    return 1. - float(np.mean(valid))
+
+# Calibrated constants of problems, optionally adapted after every solve.
+# Calibrator keeps factor of only_one_const calibrated for every problem, so it adapts
+# across re-solves of different subproblems (solvers copied by other solvers share it).
+# If adaptive is True, factor is multiplied by growth when fraction of invalid
+# samples is bigger than target and by shrink otherwise (but it stays above min_factor),
+# so penalties approach the smallest ones giving valid samples.
+class PenaltyCalibrator:
+    def __init__(self, adaptive = False, target = 0.1, growth = 2., shrink = 0.8,
+            min_factor = 0.25):
+        self.adaptive = adaptive
+        self.target = target
+        self.growth = growth
+        self.shrink = shrink
+        self.min_factor = min_factor
+        self.factor = 1.
+
+    # Returns pair (only_one_const, order_const) for problem.
+    def consts(self, problem):
+        only_one_const, order_const = calibrate_penalties(problem)
+        return self.factor * only_one_const, order_const
+
+    # Adapts constants after solve with given fraction of invalid samples.
+    def update(self, invalid):
+        if not self.adaptive:
+            return
+        if invalid > self.target:
+            self.factor *= self.growth
+        else:
+            self.factor = max(self.factor * self.shrink, self.min_factor)
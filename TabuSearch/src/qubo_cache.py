@@ -0,0 +1,105 @@
+# Optional on-disk cache of qubos built by VRPProblem.
+# Qubo components (constraints and objective with constants equal to 1) are stored
+# in directory named by fingerprint of everything they depend on, as COO arrays in .npy files.
+# On hit arrays are memory-mapped, so loading qubo costs almost nothing.
+# Cache is disabled by default. It is enabled by enable(directory)
+# or by VRP_QUBO_CACHE environment variable with path of cache directory.
+#
+# Constants aren't part of fingerprint : qubo for given constants is weighted sum
+# of cached components, so one entry serves all constants.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from qubo_helper import qubo_from_coo
+
+_version = 1
+_directory = os.environ.get('VRP_QUBO_CACHE') or None
+_names = ('constraint', 'objective')
+
+# Enables cache in given directory (it is created if needed).
+def enable(directory):
+    global _directory
+    os.makedirs(directory, exist_ok=True)
+    _directory = directory
+
+def disable():
+    global _directory
+    _directory = None
+
+# Returns directory of cache or None if cache is disabled.
+def directory():
+    return _directory
+
+# Returns hex fingerprint of qubo components of problem for given limits.
+# Only part of cost matrix between dests and source is hashed, so subproblems
+# of big problem with the same destinations share entries.
+def fingerprint(problem, vehicle_limits):
+    nodes = list(problem.dests) + [problem.source]
+    digest = hashlib.sha256()
+    header = {
+        'version' : _version,
+        'dests' : [int(d) for d in problem.dests],
+        'source' : int(problem.source),
+        'capacities' : np.asarray(problem.capacities, dtype=float).tolist(),
+        'limits' : [[int(a), int(b)] for (a, b) in vehicle_limits],
+        'first_source' : bool(problem.first_source),
+        'last_source' : bool(problem.last_source),
+    }
+    digest.update(json.dumps(header, sort_keys=True).encode())
+    costs = problem.costs[np.ix_(nodes, nodes)]
+    digest.update(np.ascontiguousarray(costs, dtype=np.float64).tobytes())
+    weights = np.asarray(problem.weights)[nodes]
+    digest.update(np.ascontiguousarray(weights, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+# Returns pair of qubos (constraints, objective) from cache or None if they aren't cached.
+# table - StepIndex of qubos.
+def load(key, table):
+    if _directory is None:
+        return None
+    path = os.path.join(_directory, key)
+    try:
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+        if meta['version'] != _version or meta['size'] != table.size:
+            return None
+        qubos = list()
+        for name in _names:
+            rows, cols, values = (np.load(os.path.join(path, name + '_' + part + '.npy'), mmap_mode='r')
+                    for part in ('rows', 'cols', 'values'))
+            qubos.append(qubo_from_coo(rows, cols, values, table))
+    except (OSError, ValueError, KeyError):
+        return None
+    return tuple(qubos)
+
+# Stores qubos (constraints, objective) in cache. Entry is written in temporary
+# directory and renamed, so concurrent jobs never see partially written entry.
+def store(key, qubos):
+    if _directory is None:
+        return
+    path = os.path.join(_directory, key)
+    if os.path.exists(path):
+        return
+
+    size = qubos[0].size()
+    index_type = np.int32 if size < 2 ** 31 else np.int64
+    tmp = tempfile.mkdtemp(dir=_directory, prefix='.tmp-')
+    try:
+        for name, qubo in zip(_names, qubos):
+            rows, cols, values = qubo.get_coo()
+            np.save(os.path.join(tmp, name + '_rows.npy'), rows.astype(index_type))
+            np.save(os.path.join(tmp, name + '_cols.npy'), cols.astype(index_type))
+            np.save(os.path.join(tmp, name + '_values.npy'), values)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as meta_file:
+            json.dump({'version' : _version, 'size' : size}, meta_file)
+        os.replace(tmp, path)
+    except OSError:
+        # Other process stored the same entry first.
+        pass
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -1,43 +1,263 @@
-from itertools import product
+import numpy as np
+
+# Table of variables (step, dest) of VRP qubos. Variable (step, dest) has index
+# step * len(nodes) + position of dest in nodes, so vector of values of variables
+# reshaped to steps x nodes matrix has one row for every step.
+class StepIndex:
+    def __init__(self, steps, nodes):
+        self.steps = steps
+        self.nodes = list(nodes)
+        self.columns = {node : i for i, node in enumerate(self.nodes)}
+        self.size = steps * len(self.nodes)
+
+    # Returns index of variable (step, dest).
+    def index(self, label):
+        step, node = label
+        if step < 0 or step >= self.steps:
+            raise KeyError(label)
+        return step * len(self.nodes) + self.columns[node]
+
+    # Returns variable (step, dest) with given index.
+    def label(self, i):
+        step, column = divmod(int(i), len(self.nodes))
+        return (step, self.nodes[column])
+
+    # Returns steps x nodes matrix of values of variables from vector indexed by table.
+    def matrix(self, vector):
+        return np.asarray(vector)[:self.size].reshape(self.steps, len(self.nodes))
 
 # Simple class that helps creating qubo dict for DWave solvers.
+# Coefficients are kept in COO format : every variable (label, for example (step, dest) pair)
+# gets integer index and terms are stored in numpy arrays of rows, columns and values.
+# Scaling of merge_with is applied lazily and duplicated terms are summed only when
+# qubo is exported, so building qubo costs about as much as writing its terms.
+# Exported qubo is upper-triangular : (a, b) and (b, a) terms are summed into one.
+# Only variables used by some term are exported.
+# table - StepIndex used to index variables. Without it variables are indexed
+# in order of creation.
 class Qubo:
-    def __init__(self):
-        self.dict = dict()
+    def __init__(self, table = None):
+        # Labels of variables and their indices.
+        self.table = table
+        self.labels = list()
+        self.variables = dict()
+
+        # Chunks of terms : (rows, cols, values). Values should be multiplied by scale.
+        self._chunks = list()
+        self._scale = 1.
+        self._compacted = None
+
+        # Terms added one by one by add, not yet moved to chunk.
+        self._rows = list()
+        self._cols = list()
+        self._values = list()
+
+        self._dict = None
+
+    # Returns index of variable with given label, creating it if needed.
+    def index(self, label):
+        if self.table is not None:
+            return self.table.index(label)
+        i = self.variables.get(label)
+        if i is None:
+            i = len(self.labels)
+            self.variables[label] = i
+            self.labels.append(label)
+        return i
 
-    # Creates new field in dict.
+    # Returns array of indices of variables with given labels.
+    def indices(self, labels):
+        return np.fromiter((self.index(label) for label in labels), dtype=np.int64)
+
+    # Returns label of variable with given index.
+    def label(self, i):
+        if self.table is not None:
+            return self.table.label(i)
+        return self.labels[i]
+
+    # Returns number of indices of variables.
+    def size(self):
+        if self.table is not None:
+            return self.table.size
+        return len(self.labels)
+
+    # Returns sorted array of indices of variables used by some term.
+    def used(self):
+        rows, cols, _ = self.get_coo()
+        return np.union1d(rows, cols)
+
+    # Adds terms given by arrays of indices of variables and values.
+    # Arrays are broadcast together, so blocks of terms can be added at once.
+    def add_coo(self, rows, cols, values):
+        rows, cols, values = np.broadcast_arrays(np.asarray(rows, dtype=np.int64),
+                np.asarray(cols, dtype=np.int64), np.asarray(values, dtype=float))
+        if rows.size == 0:
+            return
+        self._chunks.append((rows.ravel(), cols.ravel(), values.ravel() / self._scale))
+        self._dict = None
+
+    # Creates new field in dict (or sets existing one to 0).
     def create_field(self, field):
-        self.dict[field] = 0
+        rows, cols, values = self.get_coo()
+        i, j = sorted((self.index(field[0]), self.index(field[1])))
+        values = values.copy()
+        values[(rows == i) & (cols == j)] = 0
+        self._chunks = [(rows, cols, values)]
+        self._scale = 1.
+        self.add(field, 0)
 
     # Creates new field in dict if it doesn't exist.
     def create_not_exist_field(self, field):
-        if field in self.dict:
-            return
-        self.create_field(field)
+        self.add(field, 0)
 
     # Adds constraint to qubo that exactly one of given variables should be equal to 1.
     # Const parameter defines 'weight' of that constraint.
+    # (sum of variables - 1)^2 = -sum of variables + 2 * sum of products of pairs + 1.
     def add_only_one_constraint(self, variables, const):
-        for var in variables:
-            self.create_not_exist_field((var, var))
-            self.dict[(var, var)] -= 2 * const
-        for field in product(variables, variables):
-            self.create_not_exist_field(field)
-            self.dict[field] += const
+        idx = self.indices(variables)
+        rows, cols = np.triu_indices(len(idx), 1)
+        self.add_coo(idx, idx, -const)
+        self.add_coo(idx[rows], idx[cols], 2 * const)
 
     # Adds field to dict with given value.
     def add(self, field, value):
-        self.create_not_exist_field(field)
-        self.dict[field] += value
+        self._rows.append(self.index(field[0]))
+        self._cols.append(self.index(field[1]))
+        self._values.append(value / self._scale)
+        self._dict = None
+
+    # Moves terms added by add to chunk.
+    def _flush(self):
+        if self._rows:
+            self._chunks.append((np.array(self._rows, dtype=np.int64),
+                    np.array(self._cols, dtype=np.int64), np.array(self._values, dtype=float)))
+            self._rows, self._cols, self._values = list(), list(), list()
 
     # Merges qubo with another qubo. Consts parameters define 'weight' of each qubo.
     def merge_with(self, qubo, const1, const2):
-        for field in self.dict:
-            self.dict[field] *= const1
-        for field in qubo.dict:
-            self.create_not_exist_field(field)
-            self.dict[field] += qubo.dict[field] * const2
+        self._flush()
+        if const1 == 0:
+            self._chunks = list()
+            self._scale = 1.
+        else:
+            self._scale *= const1
+
+        rows, cols, values = qubo.get_coo()
+        if self.table is not None and qubo.table is self.table:
+            self.add_coo(rows, cols, values * const2)
+            return
+
+        used = qubo.used()
+        if len(used) != 0:
+            mapping = np.zeros(qubo.size(), dtype=np.int64)
+            mapping[used] = self.indices([qubo.label(i) for i in used])
+            self.add_coo(mapping[rows], mapping[cols], values * const2)
+        self._dict = None
+
+    # Returns upper-triangular qubo with summed duplicates as arrays (rows, cols, values)
+    # of indices of variables and values. Rows and columns are sorted.
+    def get_coo(self):
+        self._flush()
+        n = self.size()
+        if not self._chunks:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        if len(self._chunks) == 1 and self._chunks[0] is self._compacted and self._scale == 1.:
+            return self._compacted
+
+        rows = np.concatenate([c[0] for c in self._chunks]).astype(np.int64)
+        cols = np.concatenate([c[1] for c in self._chunks]).astype(np.int64)
+        values = np.concatenate([c[2] for c in self._chunks]) * self._scale
+        rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+
+        # Sort-reduce of duplicated terms.
+        keys = rows * n + cols
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        values = np.add.reduceat(values[order], starts)
+        keys = keys[starts]
+        rows, cols = keys // n, keys % n
+
+        # Compacted terms replace chunks, so next call is cheap.
+        self._compacted = (rows, cols, values)
+        self._chunks = [self._compacted]
+        self._scale = 1.
+        return self._compacted
+
+    # Returns qubo with terms of variables whose indices are allowed. It is equal to this qubo
+    # with other variables fixed to 0. allowed - boolean array indexed by indices of variables.
+    def restrict(self, allowed):
+        rows, cols, values = self.get_coo()
+        allowed = np.asarray(allowed, dtype=bool)
+        keep = allowed[rows] & allowed[cols]
+        labels = None if self.table is not None else self.labels
+        return qubo_from_coo(rows[keep], cols[keep], values[keep], self.table, labels)
 
     # Returns qubos dict which can be used in communication with DWave.
+    # Diagonal fields go first in order of indices of variables, so variables of qubo
+    # have the same order as their indices.
     def get_dict(self):
-        return self.dict
+        if self._dict is not None:
+            return self._dict
+
+        rows, cols, values = self.get_coo()
+        labels = {i : self.label(i) for i in self.used().tolist()}
+        result = {(label, label) : 0. for label in labels.values()}
+        for i, j, value in zip(rows.tolist(), cols.tolist(), values.tolist()):
+            result[(labels[i], labels[j])] = value
+
+        self._dict = result
+        return result
+
+    @property
+    def dict(self):
+        return self.get_dict()
+
+    # Returns qubo dict with indices of variables as labels.
+    # Samplers work faster on integer labels and results can be decoded as vectors.
+    def get_index_dict(self):
+        rows, cols, values = self.get_coo()
+        result = {(i, i) : 0. for i in self.used().tolist()}
+        result.update(zip(zip(rows.tolist(), cols.tolist()), values.tolist()))
+        return result
+
+    # Returns dimod BinaryQuadraticModel with used variables of qubo.
+    # integer_labels - if True, variables are labelled by their indices.
+    def get_bqm(self, integer_labels = False):
+        import dimod
+
+        rows, cols, values = self.get_coo()
+        used = self.used()
+        rows = np.searchsorted(used, rows)
+        cols = np.searchsorted(used, cols)
+        diagonal = rows == cols
+        linear = np.zeros(len(used))
+        np.add.at(linear, rows[diagonal], values[diagonal])
+        off = ~diagonal
+        if integer_labels:
+            variable_order = used.tolist()
+        else:
+            variable_order = [self.label(i) for i in used.tolist()]
+        return dimod.BinaryQuadraticModel.from_numpy_vectors(linear,
+                (rows[off], cols[off], values[off]), 0.0, dimod.BINARY,
+                variable_order = variable_order)
+
+# Returns new qubo equal to sum of qubos multiplied by consts.
+# If qubos share table, it is just concatenation of their terms.
+def weighted_sum(qubos, consts):
+    result = Qubo(qubos[0].table)
+    for qubo, const in zip(qubos, consts):
+        result.merge_with(qubo, 1., const)
+    return result
+
+# Returns qubo with terms given by upper-triangular arrays (rows, cols, values)
+# without duplicates, for example returned by get_coo. Arrays aren't copied.
+def qubo_from_coo(rows, cols, values, table = None, labels = None):
+    qubo = Qubo(table)
+    if labels is not None:
+        for label in labels:
+            qubo.index(label)
+    qubo._compacted = (rows, cols, values)
+    qubo._chunks = [qubo._compacted]
+    return qubo
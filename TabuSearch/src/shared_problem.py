@@ -0,0 +1,259 @@
+# Publishing VRPProblem for worker processes without pickling its arrays.
+# Arrays of problem are stored in one shared memory segment (or one memory-mapped file).
+# Workers get small picklable SharedProblemHandle and attach to it by name,
+# receiving VRPProblem with zero-copy read-only views of the arrays.
+#
+# Usage :
+# with SharedProblem(problem) as handle:
+#     pool.map(work, [handle] * tasks)    # in worker : problem = handle.attach()
+
+import json
+import os
+import weakref
+from collections.abc import Mapping
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from vrp_problem import VRPProblem, NodeMap
+from cost_matrix import ScaledCosts, DistanceOracle, SourceCosts
+
+_align = 64
+_magic = b'VRPPROB1'
+
+# Names of segments published by this process. They are tracked by resource tracker
+# of the publisher, so attaching in this process mustn't unregister them.
+_published = set()
+
+# Read-only mapping view of time windows stored in arrays.
+# Keys are strings with node ids, as in VRPProblem.time_intervals.
+class _TimeIntervals(Mapping):
+    def __init__(self, ready, due):
+        self.ready = ready
+        self.due = due
+
+    def __getitem__(self, key):
+        node = int(key)
+        if node < 0 or node >= len(self.ready) or np.isnan(self.ready[node]):
+            raise KeyError(key)
+        return (self.ready[node], self.due[node])
+
+    def __iter__(self):
+        return (str(node) for node in np.flatnonzero(~np.isnan(self.ready)))
+
+    def __len__(self):
+        return int(np.count_nonzero(~np.isnan(self.ready)))
+
+# Returns dict of arrays describing problem and dict of its scalar attributes.
+def _problem_arrays(problem):
+    n = len(problem.costs)
+    costs = problem.costs
+    if isinstance(costs, SourceCosts):
+        costs = costs.base
+    if isinstance(costs, ScaledCosts):
+        costs = costs.data
+    elif isinstance(costs, DistanceOracle):
+        costs = costs.coords
+    ready = np.full(n, np.nan)
+    due = np.full(n, np.nan)
+    for key, (r, d) in problem.time_intervals.items():
+        ready[int(key)] = r
+        due[int(key)] = d
+
+    arrays = {
+        'costs' : np.asarray(costs),
+        'weights' : np.asarray(problem.weights),
+        'capacities' : np.asarray(problem.capacities),
+        'dests' : np.asarray(problem.dests, dtype=np.int64),
+        'sources' : np.asarray(problem.sources, dtype=np.int64),
+        'services' : np.asarray(problem.services),
+        'ready' : ready,
+        'due' : due,
+        'in_nearest' : problem.in_nearest_sources.array,
+        'out_nearest' : problem.out_nearest_sources.array,
+    }
+    attrs = {
+        'source' : int(problem.source),
+        'first_source' : bool(problem.first_source),
+        'last_source' : bool(problem.last_source),
+    }
+    # Scaled costs are stored as integers with their scale, oracle as coordinates of nodes,
+    # merged source as its row and column.
+    base = problem.costs
+    if isinstance(base, SourceCosts):
+        arrays['source_row'] = base.row
+        arrays['source_column'] = base.column
+        attrs['cost_source'] = base.source
+        base = base.base
+    if isinstance(base, ScaledCosts):
+        attrs['cost_scale'] = base.scale
+    elif isinstance(base, DistanceOracle):
+        attrs['cost_oracle'] = {'decimals' : base.decimals, 'dtype' : base.dtype.str}
+    return arrays, attrs
+
+# Returns layout of arrays in one buffer : dict name -> (offset, dtype, shape) and its size.
+def _layout(arrays, start = 0):
+    layout = dict()
+    offset = start
+    for name, array in arrays.items():
+        offset = (offset + _align - 1) // _align * _align
+        layout[name] = (offset, array.dtype.str, list(array.shape))
+        offset += array.nbytes
+    return layout, max(offset, 1)
+
+# Returns dict of read-only arrays placed in buffer according to layout.
+def _views(buffer, layout):
+    views = dict()
+    for name, (offset, dtype, shape) in layout.items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+        array.setflags(write=False)
+        views[name] = array
+    return views
+
+# Creates VRPProblem from arrays without merging sources again.
+# keep_alive - object owning the memory of arrays. It lives as long as the problem.
+def _problem_from_arrays(arrays, attrs, keep_alive):
+    problem = VRPProblem.__new__(VRPProblem)
+    problem.costs = arrays['costs']
+    if attrs.get('cost_scale') is not None:
+        problem.costs = ScaledCosts(problem.costs, attrs['cost_scale'])
+    elif attrs.get('cost_oracle') is not None:
+        oracle = attrs['cost_oracle']
+        problem.costs = DistanceOracle(problem.costs, oracle['decimals'], oracle['dtype'])
+    if attrs.get('cost_source') is not None:
+        problem.costs = SourceCosts(problem.costs, attrs['cost_source'],
+                arrays['source_row'], arrays['source_column'])
+    problem.weights = arrays['weights']
+    problem.capacities = arrays['capacities']
+    problem.dests = tuple(arrays['dests'].tolist())
+    problem.sources = tuple(arrays['sources'].tolist())
+    problem.services = tuple(arrays['services'].tolist())
+    problem.time_intervals = _TimeIntervals(arrays['ready'], arrays['due'])
+    problem.in_nearest_sources = NodeMap(arrays['in_nearest'])
+    problem.out_nearest_sources = NodeMap(arrays['out_nearest'])
+    problem.source = attrs['source']
+    problem.first_source = attrs['first_source']
+    problem.last_source = attrs['last_source']
+    problem._qubo_cache = dict()
+    problem._shared_buffer = keep_alive
+    return problem
+
+# Opens existing shared memory segment without registering it in resource tracker
+# of this process. Otherwise segment would be unlinked when worker exits.
+def _open_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _published:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+# Picklable handle of published problem. It contains only names and layout of arrays.
+class SharedProblemHandle:
+    def __init__(self, name, path, layout, attrs):
+        self.name = name
+        self.path = path
+        self.layout = layout
+        self.attrs = attrs
+
+    # Returns VRPProblem backed by shared memory or memory-mapped file.
+    # Arrays are read-only views, nothing is copied.
+    def attach(self):
+        if self.path is not None:
+            buffer = np.memmap(self.path, dtype=np.uint8, mode='r')
+            return _problem_from_arrays(_views(buffer, self.layout), self.attrs, buffer)
+
+        shm = _open_shared_memory(self.name)
+        return _problem_from_arrays(_views(shm.buf, self.layout), self.attrs, shm)
+
+# Publishes problem in shared memory, or in memory-mapped file if path is given.
+# Publisher owns the memory : close (or leaving with block) releases it, so all workers
+# should be finished before. Memory is also released when SharedProblem is garbage collected.
+# keep_file - if True, file isn't removed by close and can be attached later with open_problem_file.
+# extras - dict of additional arrays stored with problem (see open_problem_arrays)
+# info - dict with additional information stored in header of file (see read_problem_header)
+class SharedProblem:
+    def __init__(self, problem, path = None, keep_file = False, extras = None, info = None):
+        arrays, attrs = _problem_arrays(problem)
+        for name, array in (extras or dict()).items():
+            if name in arrays:
+                raise ValueError('Extra array ' + name + ' has name of array of problem.')
+            arrays[name] = np.ascontiguousarray(array)
+
+        if path is None:
+            layout, size = _layout(arrays)
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            _published.add(shm.name)
+            self.handle = SharedProblemHandle(shm.name, None, layout, attrs)
+            buffer = shm.buf
+            self._finalizer = weakref.finalize(self, _release_shared_memory, shm)
+        else:
+            # File starts with magic bytes and length of JSON header.
+            header_size = 4096
+            layout, size = _layout(arrays, header_size)
+            header = json.dumps({'layout' : layout, 'attrs' : attrs, 'info' : info}).encode()
+            if len(_magic) + 8 + len(header) > header_size:
+                header_size = (len(_magic) + 8 + len(header) + _align) // _align * _align
+                layout, size = _layout(arrays, header_size)
+                header = json.dumps({'layout' : layout, 'attrs' : attrs, 'info' : info}).encode()
+            buffer = np.memmap(path, dtype=np.uint8, mode='w+', shape=(size,))
+            buffer[:len(_magic)] = np.frombuffer(_magic, dtype=np.uint8)
+            buffer[len(_magic):len(_magic) + 8] = np.frombuffer(
+                np.int64(len(header)).tobytes(), dtype=np.uint8)
+            buffer[len(_magic) + 8:len(_magic) + 8 + len(header)] = np.frombuffer(header, dtype=np.uint8)
+            self.handle = SharedProblemHandle(None, path, layout, attrs)
+            self._finalizer = weakref.finalize(self, _release_file, None if keep_file else path)
+
+        for name, (offset, dtype, shape) in layout.items():
+            view = np.frombuffer(buffer, dtype=np.dtype(dtype),
+                    count=int(np.prod(shape)), offset=offset).reshape(shape)
+            view[...] = arrays[name]
+            del view
+
+        if path is not None:
+            buffer.flush()
+        del buffer
+
+    # Releases shared memory or removes file.
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self.handle
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def _release_shared_memory(shm):
+    _published.discard(shm.name)
+    try:
+        shm.close()
+    except BufferError:
+        # Problem attached in this process is still alive, memory is freed with it.
+        pass
+    shm.unlink()
+
+def _release_file(path):
+    if path is not None and os.path.exists(path):
+        os.remove(path)
+
+# Returns header of file written by SharedProblem(problem, path, keep_file = True) :
+# dict with layout of arrays, attributes of problem and info.
+def read_problem_header(path):
+    with open(path, 'rb') as in_file:
+        if in_file.read(len(_magic)) != _magic:
+            raise ValueError('File ' + str(path) + ' is not a problem file.')
+        header_len = int(np.frombuffer(in_file.read(8), dtype=np.int64)[0])
+        return json.loads(in_file.read(header_len).decode())
+
+# Returns VRPProblem memory-mapped from file written by SharedProblem(problem, path, keep_file = True).
+def open_problem_file(path):
+    header = read_problem_header(path)
+    return SharedProblemHandle(None, path, header['layout'], header['attrs']).attach()
+
+# Returns dict of read-only memory-mapped arrays with given names (for example extras) from problem file.
+def open_problem_arrays(path, names):
+    layout = read_problem_header(path)['layout']
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    return _views(buffer, {name : layout[name] for name in names})
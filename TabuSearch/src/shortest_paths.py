@@ -0,0 +1,109 @@
+# Costs of shortest paths between nodes of road graphs (see input.read_full_test).
+# Graph is kept as CSR adjacency matrix and distances are computed by multi-source
+# Dijkstra of scipy, only from nodes of instance. Chunks of sources can be computed
+# in worker processes.
+# Graphs and cost matrices are cached in memory, so instances sharing graph file
+# or set of nodes don't compute them again.
+
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+
+_graphs = OrderedDict()
+_costs = OrderedDict()
+_max_graphs = 4
+_max_costs = 16
+
+# Graph of worker process, set by _init_worker.
+_worker_graph = None
+
+# Road graph read from file.
+# adjacency - CSR matrix with costs of edges (indices of nodes are positions in ids)
+# ids - sorted array of ids of nodes
+class RoadGraph:
+    def __init__(self, adjacency, ids):
+        self.adjacency = adjacency
+        self.ids = ids
+
+    # Returns array of indices of nodes with given ids.
+    def indices(self, node_ids):
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        indices = np.searchsorted(self.ids, node_ids)
+        indices = np.minimum(indices, len(self.ids) - 1)
+        missing = self.ids[indices] != node_ids
+        if missing.any():
+            raise KeyError(int(node_ids[missing][0]))
+        return indices
+
+def _file_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def _remember(cache, key, value, max_size):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+# Returns RoadGraph read from csv file with header and rows id1,id2,cost of directed edges.
+# If edge is given many times, the last cost is used.
+def read_graph(path):
+    key = _file_key(path)
+    if key in _graphs:
+        _graphs.move_to_end(key)
+        return _graphs[key]
+
+    edges = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+    sources = edges[:, 0].astype(np.int64)
+    targets = edges[:, 1].astype(np.int64)
+    ids, positions = np.unique(np.concatenate([sources, targets]), return_inverse=True)
+    rows, cols = positions[:len(edges)], positions[len(edges):]
+
+    # Last cost of every edge (CSR would sum duplicates).
+    n = len(ids)
+    keys = rows * n + cols
+    _, last = np.unique(keys[::-1], return_index=True)
+    last = len(keys) - 1 - last
+    adjacency = sp.csr_matrix((edges[last, 2], (rows[last], cols[last])), shape=(n, n))
+
+    graph = RoadGraph(adjacency, ids)
+    _remember(_graphs, key, graph, _max_graphs)
+    return graph
+
+def _init_worker(adjacency):
+    global _worker_graph
+    _worker_graph = adjacency
+
+def _chunk_costs(sources, targets):
+    return dijkstra(_worker_graph, directed=True, indices=sources)[:, targets]
+
+# Returns matrix of costs of shortest paths between nodes with given ids.
+# workers - number of worker processes (None or 1 - computed in this process)
+# chunk - number of sources given to worker at once
+def shortest_path_costs(graph_path, node_ids, workers = None, chunk = 64):
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    key = (_file_key(graph_path), node_ids.tobytes())
+    if key in _costs:
+        _costs.move_to_end(key)
+        return _costs[key]
+
+    graph = read_graph(graph_path)
+    nodes = graph.indices(node_ids)
+    if workers is None or workers <= 1 or len(nodes) <= chunk:
+        costs = dijkstra(graph.adjacency, directed=True, indices=nodes)[:, nodes]
+    else:
+        chunks = [nodes[i:i + chunk] for i in range(0, len(nodes), chunk)]
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                initargs=(graph.adjacency,)) as executor:
+            costs = np.vstack(list(executor.map(_chunk_costs, chunks, [nodes] * len(chunks))))
+
+    if np.isinf(costs).any():
+        i, j = np.argwhere(np.isinf(costs))[0]
+        raise ValueError('Node ' + str(node_ids[j]) + ' is unreachable from node ' +
+                str(node_ids[i]) + '.')
+    costs.setflags(write=False)
+    _remember(_costs, key, costs, _max_costs)
+    return costs
@@ -0,0 +1,117 @@
+import numpy as np
+from collections import deque
+from cost_matrix import cost_matrix
+
+# Split procedure dividing one giant tour into routes of vehicles.
+# Route cost of tour[p:i] is computed in O(1) from prefix sums of loads and distances:
+# costs[source][tour[p]] + (dist[i - 1] - dist[p]) + costs[tour[i - 1]][source].
+# Minimum over feasible p is kept in a monotone queue, so every vehicle costs O(n).
+
+inf = float('inf')
+
+# Returns prefix sums of loads and distances along the tour and costs
+# of travel between source and every destination of the tour.
+def _prefix_sums(tour, costs, weights, source):
+    n = len(tour)
+    loads = np.zeros(n + 1)
+    loads[1:] = np.cumsum([weights[d] for d in tour])
+    costs = cost_matrix(costs)
+    nodes = np.asarray(tour, dtype=int)
+    dist = np.zeros(n)
+    if n > 1:
+        dist[1:] = np.cumsum(np.asarray(costs[nodes[:-1], nodes[1:]], dtype=float))
+    from_source = np.asarray(costs[source, nodes], dtype=float)
+    to_source = np.asarray(costs[nodes, source], dtype=float)
+    return loads.tolist(), (from_source - dist).tolist(), (dist + to_source).tolist()
+
+# Relaxes one layer of split. prev[p] is the cost of serving tour[:p] by previous layers.
+# Returns list of costs of serving tour[:i] with additional route of capacity cap
+# (or without it if it isn't better) and list of starts of that route (-1 if it is not used).
+# If unlimited is True, routes are chained in the same layer (every route has capacity cap).
+# Cost of route tour[p:i] is head[p] + tail[i - 1].
+def _split_layer(prev, cap, loads, head, tail, unlimited = False):
+    n = len(prev) - 1
+    cur = list(prev)
+    if unlimited:
+        prev = cur
+    pred = [-1] * (n + 1)
+    keys = [inf] * n
+    queue = deque()
+
+    for i in range(1, n + 1):
+        p = i - 1
+        if prev[p] < inf:
+            p_key = keys[p] = prev[p] + head[p]
+            while queue and keys[queue[-1]] >= p_key:
+                queue.pop()
+            queue.append(p)
+        while queue and loads[i] - loads[queue[0]] > cap:
+            queue.popleft()
+        if queue:
+            front = queue[0]
+            cost = keys[front] + tail[i - 1]
+            if cost < cur[i]:
+                cur[i] = cost
+                pred[i] = front
+
+    return cur, pred
+
+# Finds optimal division of tour into at most len(capacities) routes.
+# Vehicles are used in given order, route of vehicle k has load at most capacities[k].
+# Parameters :
+# tour - list of destinations (without sources)
+# costs, weights - as in VRPProblem
+# capacities - list of capacities of vehicles
+# source - id of source that starts and ends every route
+# Returns pair (cost, routes), where routes[k] is list of destinations of k-th vehicle
+# or (None, None) if tour can't be divided.
+def split_tour(tour, costs, weights, capacities, source = 0):
+    n = len(tour)
+    vehicles = len(capacities)
+    if n == 0:
+        return 0., [[] for _ in range(vehicles)]
+
+    loads, head, tail = _prefix_sums(tour, costs, weights, source)
+    start = [0.] + [inf] * n
+
+    # For homogeneous fleet split without limit on number of vehicles is O(n).
+    # If it uses no more routes than there are vehicles it is also optimal for limited fleet.
+    if vehicles != 0 and min(capacities) == max(capacities):
+        dp, pred = _split_layer(start, capacities[0], loads, head, tail, unlimited = True)
+        if dp[n] == inf:
+            return None, None
+
+        # Each route ends in position i, so following pred from n counts routes.
+        routes = list()
+        i = n
+        while i > 0:
+            p = pred[i]
+            routes.append(list(tour[p:i]))
+            i = p
+        if len(routes) <= vehicles:
+            routes.reverse()
+            routes += [[] for _ in range(vehicles - len(routes))]
+            return dp[n], routes
+
+    # Split with limited fleet, one layer for every vehicle.
+    layers = list()
+    dp = start
+    for cap in capacities:
+        dp, pred = _split_layer(dp, cap, loads, head, tail)
+        layers.append(pred)
+
+    if dp[n] == inf:
+        return None, None
+
+    routes = list()
+    i = n
+    for pred in reversed(layers):
+        p = pred[i]
+        if p == -1:
+            routes.append([])
+        else:
+            routes.append(list(tour[p:i]))
+            i = p
+    routes.reverse()
+
+    return dp[n], routes
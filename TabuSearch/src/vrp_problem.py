@@ -1,9 +1,70 @@
-from qubo_helper import Qubo
-from itertools import combinations, product
+from qubo_helper import Qubo, StepIndex, weighted_sum
+import qubo_cache
+from cost_matrix import cost_matrix, compact_costs, SourceCosts
+from collections.abc import Mapping
+import copy
+import numpy as np
+
+# Returns array that can't be modified. Problems are shared between solvers
+# (and threads), so their arrays are read-only.
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+# Read-only mapping from nodes to nodes stored in array indexed by nodes (-1 if node is missing).
+# Used for nearest sources of destinations.
+class NodeMap(Mapping):
+    def __init__(self, array):
+        self.array = array
+
+    def __getitem__(self, node):
+        if node < 0 or node >= len(self.array) or self.array[node] < 0:
+            raise KeyError(node)
+        return int(self.array[node])
+
+    def __iter__(self):
+        return (int(node) for node in np.flatnonzero(self.array >= 0))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.array >= 0))
+
+# Returns array of indices of qubo variables (step, dest), one row for every step.
+def _step_indices(qubo, steps, dests):
+    return qubo.indices([(step, dest) for step in steps for dest in dests]).reshape(len(steps), len(dests))
+
+# Returns submatrix of costs with given rows and columns.
+def _sub_costs(costs, rows, cols):
+    return cost_matrix(costs)[np.ix_(np.asarray(rows, dtype=int), np.asarray(cols, dtype=int))]
+
+# Adds to qubo costs of transitions from (step, dest1) to (step + 1, dest2) for all pairs of
+# destinations. idx1 and idx2 - indices of variables of consecutive steps (one row for every step),
+# costs - submatrix of costs (dests of idx1 x dests of idx2).
+def _add_transitions(qubo, idx1, idx2, costs):
+    qubo.add_coo(idx1[:, :, None], idx2[:, None, :], costs[None, :, :])
+
+# Approximate peak memory needed by one nonzero term of qubo : cached components,
+# sorting and compacting of their weighted sum and BQM passed to sampler (measured).
+_bytes_per_nonzero = 150
+
+# Predicted size of qubo, computed without building it.
+# Attributes : variables - number of used variables, nonzeros - number of terms
+# (upper-triangular, with diagonal), memory - approximate peak memory of building and sampling in bytes.
+class QuboEstimate:
+    def __init__(self, variables, nonzeros):
+        self.variables = int(variables)
+        self.nonzeros = int(nonzeros)
+        self.memory = self.nonzeros * _bytes_per_nonzero
+
+    def __repr__(self):
+        return 'QuboEstimate(variables=' + str(self.variables) + ', nonzeros=' + \
+                str(self.nonzeros) + ', memory=' + str(self.memory) + ')'
 
 # VRP problem with multi-source.
 # Class has informations about sources, costs, destinations, weights and capacities.
 # Class provides methods to formule problem as QUBO problem.
+# Problem is effectively immutable : arrays are read-only and parameters are never changed,
+# so one problem can be used by many solvers at the same time.
+# Use derive to get problem with changed attributes without copying arrays.
 class VRPProblem:
 
     # Parameters :
@@ -14,71 +75,106 @@ class VRPProblem:
     # weights - list of weights of orders
     # first_source - flag that says if we count travel between magazine and first destination to the cost
     # last_source - flag that says if we count travel between last destination and magazine to the cost
+    # time_intervals - dict with (ready time, due time) pair for every node (keys are strings)
+    # services - list with service time
+    # cost_dtype - type costs are stored with (None - type of costs), for example np.float32,
+    # or integer type storing costs multiplied by cost_scale (see cost_matrix.compact_costs)
+    # costs can also be np.memmap, cost_matrix.ScaledCosts or cost_matrix.DistanceOracle,
+    # they aren't copied (merged source is kept in cost_matrix.SourceCosts)
     def __init__(self, sources, costs, capacities, dests, weights,
-            time_intervals, services, first_source = True, last_source = True):
+            time_intervals = None, services = None, first_source = True, last_source = True,
+            cost_dtype = None, cost_scale = 1):
         # Merging all sources into one source.
         source = 0
-        weights[source] = 0
         self.source = source
-        in_nearest_sources = dict()
-        out_nearest_sources = dict()
-
-        # Finding nearest source for all destinations.
-        for dest in dests:
-            in_nearest = sources[0]
-            out_nearest = sources[0]
-            for s in sources:
-                costs[source][s] = 0
-                costs[s][source] = 0
-                if costs[s][dest] < costs[in_nearest][dest]:
-                    in_nearest = s
-                if costs[dest][s] < costs[dest][out_nearest]:
-                    out_nearest = s
-            costs[source][dest] = costs[in_nearest][dest]
-            costs[dest][source] = costs[dest][out_nearest]
-            in_nearest_sources[dest] = in_nearest
-            out_nearest_sources[dest] = out_nearest
-
-        self.costs = costs
-        self.capacities = capacities
-        self.dests = dests
-        self.weights = weights
-        self.time_intervals = time_intervals
-        self.services = services
-        self.in_nearest_sources = in_nearest_sources
-        self.out_nearest_sources = out_nearest_sources
+        sources_array = np.asarray(sources, dtype=int)
+        dests_array = np.asarray(dests, dtype=int)
+        costs = cost_matrix(costs)
+        if cost_dtype is not None:
+            costs = compact_costs(costs, cost_dtype, cost_scale)
+        n = len(costs)
+
+        # Finding nearest source for all destinations (first one if there are many).
+        in_nearest = sources_array[np.argmin(costs[np.ix_(sources_array, dests_array)], axis=0)]
+        out_nearest = sources_array[np.argmin(costs[np.ix_(dests_array, sources_array)], axis=1)]
+        in_nearest_sources = np.full(n, -1, dtype=np.int64)
+        out_nearest_sources = np.full(n, -1, dtype=np.int64)
+        in_nearest_sources[dests_array] = in_nearest
+        out_nearest_sources[dests_array] = out_nearest
+
+        # Source row and column have costs of nearest sources. Parameters are never changed,
+        # so costs aren't copied : if merging changes them (it doesn't for one source),
+        # the new row and column are put over costs by SourceCosts.
+        source_row = np.array(costs[source])
+        source_column = np.array(costs[:, source])
+        source_row[sources_array] = 0
+        source_column[sources_array] = 0
+        source_row[dests_array] = costs[in_nearest, dests_array]
+        source_column[dests_array] = costs[dests_array, out_nearest]
+        costs = costs.view()
+        if not np.array_equal(source_row, costs[source]) or not np.array_equal(source_column, costs[:, source]):
+            costs = SourceCosts(costs, source, source_row, source_column)
+
+        weights = np.array(weights)
+        weights[source] = 0
+
+        self.costs = _read_only(costs)
+        self.capacities = _read_only(np.array(capacities))
+        self.dests = tuple(dests)
+        self.weights = _read_only(weights)
+        self.time_intervals = dict(time_intervals) if time_intervals is not None else dict()
+        self.services = tuple(services) if services is not None else (0,)
+        self.in_nearest_sources = NodeMap(_read_only(in_nearest_sources))
+        self.out_nearest_sources = NodeMap(_read_only(out_nearest_sources))
         self.first_source = first_source
         self.last_source = last_source
-        self.sources = sources
+        self.sources = tuple(sources)
+        self._qubo_cache = dict()
+
+    # Returns problem sharing arrays with this problem, with given attributes replaced.
+    # Sources aren't merged again, so it is cheap way to create subproblems.
+    # dests - subset of destinations
+    # capacities - list of capacities of vehicles
+    def derive(self, dests = None, capacities = None, first_source = None, last_source = None):
+        problem = copy.copy(self)
+        problem._qubo_cache = dict()
+        if dests is not None:
+            problem.dests = tuple(dests)
+        if capacities is not None:
+            problem.capacities = _read_only(np.array(capacities))
+        if first_source is not None:
+            problem.first_source = first_source
+        if last_source is not None:
+            problem.last_source = last_source
+        return problem
+
+    # Returns table of indices of variables (step, dest) of qubos with given number of steps.
+    # Destinations are followed by source (vehicles wait in source after their last destination).
+    def get_step_index(self, steps):
+        return StepIndex(steps, list(self.dests) + [self.source])
 
     # Returns qubo with information about capacities.
     def get_capacity_qubo(self, capacity, start_step, final_step):
-        dests = self.dests
-        weights = self.weights
+        dests = np.asarray(self.dests)
+        weights = np.asarray(self.weights, dtype=float)[dests]
         cap_qubo = Qubo()
+        idx = _step_indices(cap_qubo, range(start_step, final_step + 1), self.dests)
 
-        for (d1, d2) in combinations(dests, 2):
-            for (s1, s2) in combinations(range(start_step, final_step + 1), 2):
-                index = ((s1, d1), (s2, d2))
-                index2 = ((s1, d2), (s2, d1))
-                cost = weights[d1] * weights[d2] / capacity**2
-                cap_qubo.add(index, cost)
-                cap_qubo.add(index2, cost)
+        # Every pair of different destinations on every pair of steps s1 < s2.
+        s1, s2 = np.triu_indices(len(idx), 1)
+        d1, d2 = np.nonzero(~np.eye(len(dests), dtype=bool))
+        cost = weights[d1] * weights[d2] / capacity**2
+        cap_qubo.add_coo(idx[s1][:, d1], idx[s2][:, d2], cost[None, :])
 
         return cap_qubo
 
     # Returns qubo with information about costs between destinations.
     def get_order_qubo(self, start_step, final_step, dests, costs):
-        source = self.source
         ord_qubo = Qubo()
 
         # Order constraints.
-        for step in range(start_step, final_step):
-            for dest1 in dests:
-                for dest2 in dests:
-                    cost = costs[dest1][dest2]
-                    index = ((step, dest1), (step + 1, dest2))
-                    ord_qubo.add(index, cost)
+        idx = _step_indices(ord_qubo, range(start_step, final_step + 1), dests)
+        _add_transitions(ord_qubo, idx[:-1], idx[1:], _sub_costs(costs, dests, dests))
 
         return ord_qubo
 
@@ -87,10 +183,8 @@ class VRPProblem:
     def get_first_dest_qubo(self, start_step, dests, costs, source):
         fir_qubo = Qubo()
 
-        for dest in dests:
-            in_index = ((start_step, dest), (start_step, dest))
-            in_cost = costs[source][dest]
-            fir_qubo.add(in_index, in_cost)
+        idx = _step_indices(fir_qubo, [start_step], dests)[0]
+        fir_qubo.add_coo(idx, idx, _sub_costs(costs, [source], dests)[0])
 
         return fir_qubo
 
@@ -99,49 +193,89 @@ class VRPProblem:
     def get_last_dest_qubo(self, final_step, dests, costs, source):
         las_qubo = Qubo()
 
-        for dest in dests:
-            out_index = ((final_step, dest), (final_step, dest))
-            out_cost = costs[dest][source]
-            las_qubo.add(out_index, out_cost)
+        idx = _step_indices(las_qubo, [final_step], dests)[0]
+        las_qubo.add_coo(idx, idx, _sub_costs(costs, dests, [source])[:, 0])
 
         return las_qubo
 
     # Returns qubo with additional constraint, that every vehicle has
     # specified number of deliveries that it need to serve.
     def get_qubo_with_partition(self, vehicle_partitions,
-            only_one_const, order_const):
+            only_one_const, order_const, symmetry_breaking = False):
         limits = [(r, r) for r in vehicle_partitions]
         return self.get_qubo_with_both_limits(limits,
-                only_one_const, order_const)
+                only_one_const, order_const, symmetry_breaking)
 
     # Returns qubo with additional constraint, that every vehicle has
     # specified maximum number of deliveries that it can serve.
     def get_qubo_with_limits(self, vehicle_limits,
-            only_one_const, order_const):
+            only_one_const, order_const, symmetry_breaking = False):
         limits = [(0, r) for r in vehicle_limits]
         return self.get_qubo_with_both_limits(limits,
-                only_one_const, order_const)
+                only_one_const, order_const, symmetry_breaking)
 
     # Returns qubo with additional constraint that every vehicle has
     # specified minimum and maximum number of deliveries that it can serve.
     # vehicles_limits - list of pairs (a, b), a <= b.
+    # Qubo is weighted sum of constraint and objective qubos, which are built once
+    # for given limits and cached, so changing constants doesn't rebuild qubo.
+    # symmetry_breaking - if True, variables excluded by get_symmetry_mask are removed.
     def get_qubo_with_both_limits(self, vehicle_limits,
-            only_one_const, order_const):
+            only_one_const, order_const, symmetry_breaking = False):
+        allowed = None
+        if symmetry_breaking:
+            allowed = self.get_symmetry_mask(vehicle_limits)
+        return self._restricted_qubo(vehicle_limits, only_one_const, order_const, allowed)
+
+    # Returns weighted sum of qubo components for given limits restricted to allowed
+    # variables (boolean array steps x nodes, None - all variables).
+    def _restricted_qubo(self, vehicle_limits, only_one_const, order_const, allowed = None):
+        constraint_qubo, objective_qubo = self.get_qubo_components(vehicle_limits)
+        if allowed is not None:
+            constraint_qubo = constraint_qubo.restrict(allowed.ravel())
+            objective_qubo = objective_qubo.restrict(allowed.ravel())
+        return weighted_sum([constraint_qubo, objective_qubo], [only_one_const, order_const])
+
+    # Returns pair of qubos (constraints, objective) for given limits,
+    # both with constants equal to 1. Qubos are cached and they shouldn't be modified.
+    # If on-disk cache is enabled (see qubo_cache), qubos are also loaded from it or stored in it.
+    # vehicles_limits - list of pairs (a, b), a <= b.
+    def get_qubo_components(self, vehicle_limits):
+        key = (tuple((int(a), int(b)) for (a, b) in vehicle_limits), self.first_source, self.last_source)
+        components = self._qubo_cache.get(key)
+        if components is None:
+            disk_key = None
+            if qubo_cache.directory() is not None:
+                disk_key = qubo_cache.fingerprint(self, vehicle_limits)
+                steps = sum(r for (_, r) in vehicle_limits)
+                components = qubo_cache.load(disk_key, self.get_step_index(steps))
+            if components is None:
+                components = self._build_qubo_components(vehicle_limits)
+                if disk_key is not None:
+                    qubo_cache.store(disk_key, components)
+            self._qubo_cache[key] = components
+        return components
+
+    # Removes cached qubo components.
+    def clear_qubo_cache(self):
+        self._qubo_cache = dict()
+
+    def _build_qubo_components(self, vehicle_limits):
         steps = 0
         for (_, r) in vehicle_limits:
             steps += r
 
-        capacities = self.capacities
         dests = self.dests
         source = self.source
-        dests_with_source = dests.copy()
-        dests_with_source.append(source)
+        dests_with_source = list(dests) + [source]
         costs = self.costs
-        vrp_qubo = Qubo()
+        table = self.get_step_index(steps)
+        con_qubo = Qubo(table)
+        obj_qubo = Qubo(table)
 
         # Only one step for one destination.
         for dest in self.dests:
-            vrp_qubo.add_only_one_constraint([(step, dest) for step in range(steps)], only_one_const) 
+            con_qubo.add_only_one_constraint([(step, dest) for step in range(steps)], 1.)
 
         start = 0
         for vehicle in range(len(vehicle_limits)):
@@ -150,27 +284,30 @@ class VRPProblem:
             min_final = start + min_size - 1
             max_final = start + max_size - 1
 
+            # Vehicle without steps (for example lighter than every order) has no variables,
+            # VRPSolution decodes it as empty route.
+            if max_size == 0:
+                continue
+
             # First steps should have normal destinations.
             if min_size != 0:
                 for step in range(start, min_final + 1):
-                    vrp_qubo.add_only_one_constraint([(step, dest) for dest in dests], only_one_const) 
+                    con_qubo.add_only_one_constraint([(step, dest) for dest in dests], 1.)
                 ord_min_qubo = self.get_order_qubo(start, min_final, dests, costs)
-                vrp_qubo.merge_with(ord_min_qubo, 1., order_const)
+                obj_qubo.merge_with(ord_min_qubo, 1., 1.)
 
             # In other steps vehicles can wait in source.
             if max_size != min_size:
                 for step in range(min_final + 1, max_final + 1):
-                    vrp_qubo.add_only_one_constraint([(step, dest) for dest in dests_with_source], only_one_const)
+                    con_qubo.add_only_one_constraint([(step, dest) for dest in dests_with_source], 1.)
                 ord_max_qubo = self.get_order_qubo(min_final + 1, max_final, dests_with_source, costs)
-                vrp_qubo.merge_with(ord_max_qubo, 1., order_const)
+                obj_qubo.merge_with(ord_max_qubo, 1., 1.)
 
             # From min_final step to min_final + 1 step.
             if min_size != 0 and min_size != max_size:
-                for dest1 in dests:
-                    for dest2 in dests_with_source:
-                        cost = costs[dest1][dest2]
-                        index = ((min_final, dest1), (min_final + 1, dest2))
-                        vrp_qubo.add(index, cost * order_const)
+                idx1 = _step_indices(obj_qubo, [min_final], dests)
+                idx2 = _step_indices(obj_qubo, [min_final + 1], dests_with_source)
+                _add_transitions(obj_qubo, idx1, idx2, _sub_costs(costs, dests, dests_with_source))
 
             # First and last destinations.
             if self.first_source:
@@ -179,23 +316,162 @@ class VRPProblem:
                     fir_qubo = self.get_first_dest_qubo(start, dests, costs, source)
                 else:
                     fir_qubo = self.get_first_dest_qubo(start, dests_with_source, costs, source)
-                vrp_qubo.merge_with(fir_qubo, 1., order_const)
+                obj_qubo.merge_with(fir_qubo, 1., 1.)
             if self.last_source:
                 las_qubo = None
                 if max_size != min_size:
                     las_qubo = self.get_last_dest_qubo(max_final, dests_with_source, costs, source)
                 else:
                     las_qubo = self.get_last_dest_qubo(max_final, dests, costs, source)
-                vrp_qubo.merge_with(las_qubo, 1., order_const)
+                obj_qubo.merge_with(las_qubo, 1., 1.)
 
             start = max_final + 1
 
-        return vrp_qubo
+        # Compacting terms before qubos are shared.
+        con_qubo.get_coo()
+        obj_qubo.get_coo()
+        return con_qubo, obj_qubo
+
+    # Returns QuboEstimate of qubo returned by get_qubo_with_both_limits for given limits.
+    # Every step has one-hot constraint, every destination has one-hot constraint over all steps
+    # and consecutive steps of vehicle are coupled by costs of travel (these terms include
+    # pairs of the same destination), so number of terms follows from numbers of columns of steps.
+    def estimate_qubo_with_both_limits(self, vehicle_limits):
+        dests = len(self.dests)
+        steps = 0
+        variables = 0
+        step_pairs = 0
+        transitions = 0
+        for (min_size, max_size) in vehicle_limits:
+            columns = [dests] * min_size + [dests + 1] * (max_size - min_size)
+            steps += max_size
+            variables += sum(columns)
+            step_pairs += sum(c * (c - 1) // 2 for c in columns)
+            transitions += sum(a * b - dests for a, b in zip(columns[:-1], columns[1:]))
+        dest_pairs = dests * (steps * (steps - 1) // 2)
+        return QuboEstimate(variables, variables + step_pairs + dest_pairs + transitions)
+
+    # Returns QuboEstimate of qubo returned by get_qubo_with_limits for given limits.
+    def estimate_qubo_with_limits(self, vehicle_limits):
+        return self.estimate_qubo_with_both_limits([(0, r) for r in vehicle_limits])
+
+    # Returns QuboEstimate of qubo returned by get_full_qubo.
+    def estimate_full_qubo(self):
+        dests = len(self.dests)
+        return self.estimate_qubo_with_limits([dests for _ in range(len(self.capacities))])
+
+    # Returns QuboEstimate of qubo returned by get_capacity_qubo.
+    def estimate_capacity_qubo(self, capacity, start_step, final_step):
+        dests = len(self.dests)
+        steps = final_step - start_step + 1
+        pairs = steps * (steps - 1) // 2 * dests * (dests - 1)
+        variables = steps * dests if pairs != 0 else 0
+        return QuboEstimate(variables, pairs)
+
+    # Returns list of maximum numbers of deliveries of vehicles. Vehicle can't serve
+    # more destinations than the lightest ones fitting its capacity.
+    def max_route_lengths(self):
+        weights = np.sort(np.asarray(self.weights, dtype=float)[np.asarray(self.dests, dtype=int)])
+        loads = np.cumsum(weights)
+        return [int(np.searchsorted(loads, capacity, side='right')) for capacity in self.capacities]
+
+    # Returns boolean array steps x nodes (as in get_step_index) with False for variables
+    # (step, dest) which can't be used because of time windows. Every step of vehicle is
+    # its position in route, arrival in position p is bounded from below by
+    # arrival[p][d] >= max(ready[d], min over e of (arrival[p - 1][e] + service + costs[e][d])).
+    # vehicle_limits - maximum numbers of deliveries of vehicles.
+    def get_time_window_mask(self, vehicle_limits):
+        table = self.get_step_index(sum(vehicle_limits))
+        mask = np.ones((table.steps, len(table.nodes)), dtype=bool)
+        if not self.time_intervals or len(self.dests) == 0:
+            return mask
+
+        dests = np.asarray(self.dests, dtype=int)
+        ready = np.full(len(dests), -np.inf)
+        due = np.full(len(dests), np.inf)
+        for i, dest in enumerate(self.dests):
+            interval = self.time_intervals.get(str(dest))
+            if interval is not None:
+                ready[i], due[i] = interval
+        service = self.services[0] if len(self.services) != 0 else 0
+        costs = np.asarray(_sub_costs(self.costs, dests, dests), dtype=float)
+        np.fill_diagonal(costs, np.inf)
+
+        arrival = np.maximum(ready, np.asarray(self.costs[self.source, dests], dtype=float))
+        positions = [arrival > due]
+        for _ in range(1, max(vehicle_limits)):
+            arrival = np.maximum(ready, np.min(arrival[:, None] + service + costs, axis=0))
+            positions.append(arrival > due)
+
+        start = 0
+        for limit in vehicle_limits:
+            for p in range(limit):
+                mask[start + p, :len(dests)] = ~positions[p]
+            start += limit
+        return mask
+
+    # Returns True if vehicles with given limits (pairs (a, b)) are identical,
+    # so their order in solution doesn't matter.
+    def is_homogeneous(self, vehicle_limits):
+        capacities = np.asarray(self.capacities)
+        limits = set((int(a), int(b)) for (a, b) in vehicle_limits)
+        return len(limits) <= 1 and bool(np.all(capacities == capacities[:1]))
+
+    # Returns ranks of destinations used by symmetry breaking. Destinations
+    # farthest from source go first, they are the most likely to be in different routes.
+    def symmetry_ranks(self):
+        dests = np.asarray(self.dests, dtype=int)
+        costs = self.costs
+        distances = costs[self.source, dests] + costs[dests, self.source]
+        ranks = np.empty(len(dests), dtype=np.int64)
+        ranks[np.argsort(-distances, kind='stable')] = np.arange(len(dests))
+        return ranks
+
+    # Returns boolean array steps x nodes (as in get_step_index) with False for variables
+    # excluded by symmetry breaking. Identical vehicles are ordered by the lowest rank
+    # of their destinations (empty vehicles go last), so destination of rank r can be
+    # served only by vehicles 0, ..., r. Every solution has equivalent solution in this order.
+    # For different vehicles nothing is excluded.
+    # vehicle_limits - list of pairs (a, b), a <= b.
+    def get_symmetry_mask(self, vehicle_limits):
+        table = self.get_step_index(sum(r for (_, r) in vehicle_limits))
+        mask = np.ones((table.steps, len(table.nodes)), dtype=bool)
+        if not self.is_homogeneous(vehicle_limits):
+            return mask
+
+        ranks = self.symmetry_ranks()
+        start = 0
+        for vehicle, (_, max_size) in enumerate(vehicle_limits):
+            mask[start:start + max_size, :len(self.dests)] = ranks >= vehicle
+            start += max_size
+        return mask
+
+    # Returns routes of identical vehicles reordered as required by get_symmetry_mask.
+    def order_routes(self, routes):
+        ranks = dict(zip(self.dests, self.symmetry_ranks().tolist()))
+        def first_rank(route):
+            return min((ranks[node] for node in route if node in ranks), default=len(ranks))
+        return sorted(routes, key=first_rank)
+
+    # Returns qubo with steps limited by capacities of vehicles (see max_route_lengths)
+    # and, if time_windows is True, without variables excluded by get_time_window_mask.
+    # symmetry_breaking - as in get_qubo_with_both_limits.
+    # Solution should be decoded with vehicle_limits = max_route_lengths().
+    def get_compact_qubo(self, only_one_const, order_const, time_windows = True,
+            symmetry_breaking = False):
+        limits = [(0, r) for r in self.max_route_lengths()]
+        allowed = None
+        if time_windows and self.time_intervals:
+            allowed = self.get_time_window_mask([r for (_, r) in limits])
+        if symmetry_breaking:
+            mask = self.get_symmetry_mask(limits)
+            allowed = mask if allowed is None else allowed & mask
+        return self._restricted_qubo(limits, only_one_const, order_const, allowed)
 
     # Returns qubo without additional constraints.
-    def get_full_qubo(self, only_one_const, order_const):
+    def get_full_qubo(self, only_one_const, order_const, symmetry_breaking = False):
         dests = len(self.dests)
         vehicles = len(self.capacities)
 
         limits = [dests for _ in range(vehicles)]
-        return self.get_qubo_with_limits(limits, only_one_const, order_const)
+        return self.get_qubo_with_limits(limits, only_one_const, order_const, symmetry_breaking)
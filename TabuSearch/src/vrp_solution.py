@@ -1,3 +1,34 @@
+import numpy as np
+
+# Returns vector of values of variables indexed by table.
+# sample - vector or dict (or dimod sample) with (step, dest) or integer labels.
+def _sample_vector(sample, table):
+    if isinstance(sample, np.ndarray):
+        return sample
+
+    vector = np.zeros(table.size, dtype=np.int8)
+    for label, value in sample.items():
+        if value:
+            i = label if isinstance(label, (int, np.integer)) else table.index(label)
+            vector[i] = value
+    return vector
+
+# Returns array count x variables of initial states for sampling of qubo indexed by table :
+# vector and its copies perturbed by random swaps of pairs of steps.
+# Swaps keep every destination in exactly one step, so copies are still correct.
+def warm_start_states(vector, table, count, swaps = 2, seed = None):
+    rng = np.random.default_rng(seed)
+    matrix = table.matrix(vector)
+    states = np.zeros((count, table.size), dtype=np.int8)
+    for k in range(count):
+        copy = matrix.copy()
+        if k != 0 and table.steps >= 2:
+            for _ in range(swaps):
+                i, j = rng.choice(table.steps, 2, replace=False)
+                copy[[i, j]] = copy[[j, i]]
+        states[k, :matrix.size] = copy.ravel()
+    return states
+
 # Solution of VRP problem with multi-source. 
 # Class can decode solution from solution of QUBO.
 # Class provides methods to check and get informations about solution.
@@ -23,24 +54,24 @@ class VRPSolution:
                 vehicles = len(self.problem.capacities)
                 vehicle_limits = [dests for _ in range(vehicles)]
 
+            # Decoding solution from qubo sample. Every step has at most one destination,
+            # steps where vehicle waits in source are skipped.
+            table = problem.get_step_index(sum(vehicle_limits))
+            matrix = table.matrix(_sample_vector(sample, table))
+            active = matrix.any(axis=1).tolist()
+            columns = matrix.argmax(axis=1).tolist()
+            nodes = table.nodes
+
             result = list()
-            vehicle_result = list()
-            step = 0
-            vehicle = 0
-
-            # Decoding solution from qubo sample.
-            for (s, dest) in sample:
-                if sample[(s, dest)] == 1:
-                    if dest != 0:
+            start = 0
+            for limit in vehicle_limits:
+                vehicle_result = list()
+                for step in range(start, start + limit):
+                    dest = nodes[columns[step]]
+                    if active[step] and dest != problem.source:
                         vehicle_result.append(dest)
-                    step += 1
-                    if vehicle_limits[vehicle] == step:
-                        result.append(vehicle_result)
-                        step = 0
-                        vehicle += 1
-                        vehicle_result = list()
-                        if len(vehicle_limits) <= vehicle:
-                            break
+                result.append(vehicle_result)
+                start += limit
 
             # Adding first and last magazine.
             for l in result:
@@ -52,6 +83,36 @@ class VRPSolution:
 
             self.solution = result
 
+    # Returns solution encoded as vector of values of variables of qubo with given limits
+    # (variables (step, dest) of get_qubo_with_both_limits). Vehicle visits its destinations
+    # in its first steps and waits in source in the rest of them.
+    # vehicle_limits - maximum numbers of deliveries of vehicles, as in constructor.
+    # Raises ValueError if some route is longer than limit of its vehicle.
+    def encode(self, vehicle_limits = None):
+        problem = self.problem
+        if vehicle_limits == None:
+            dests = len(problem.dests)
+            vehicles = len(problem.capacities)
+            vehicle_limits = [dests for _ in range(vehicles)]
+        if len(self.solution) > len(vehicle_limits):
+            raise ValueError('Solution has more routes than vehicles.')
+
+        table = problem.get_step_index(sum(vehicle_limits))
+        dests = set(problem.dests)
+        vector = np.zeros(table.size, dtype=np.int8)
+        start = 0
+        for vehicle, limit in enumerate(vehicle_limits):
+            route = list()
+            if vehicle < len(self.solution):
+                route = [dest for dest in self.solution[vehicle] if dest in dests]
+            if len(route) > limit:
+                raise ValueError('Route of vehicle ' + str(vehicle) + ' is longer than its limit.')
+            for step in range(limit):
+                node = route[step] if step < len(route) else problem.source
+                vector[table.index((start + step, node))] = 1
+            start += limit
+        return vector
+
     # Checks if solution is correct.
     def check(self):
         capacities = self.problem.capacities
@@ -90,9 +151,9 @@ class VRPSolution:
                 continue
             prev = vehicle_dests[0]
             for dest in vehicle_dests[1:]:
-                cost += costs[prev][dest]
+                cost += float(costs[prev, dest])
                 prev = dest
-            cost += costs[prev][source]
+            cost += float(costs[prev, source])
 
         return cost
 
@@ -123,7 +184,7 @@ class VRPSolution:
             for i in range(len(vehicle_dests) - 1):
                 prevNode = vehicle_dests[i]
                 currentNode = vehicle_dests[i + 1]
-                travel_time = costs[prevNode][currentNode]
+                travel_time = float(costs[prevNode, currentNode])
                 readyTime = timeIntervals[str(currentNode)][0]
                 dueTime = timeIntervals[str(currentNode)][1]
                 
@@ -175,13 +236,13 @@ class VRPSolution:
             dests_num = 1
             prev = vehicle_dests[0]
             for dest in vehicle_dests[1:len(vehicle_dests) - 1]:
-                cost += costs[prev][dest]
+                cost += float(costs[prev, dest])
                 print('    Destination number ', dests_num, ' : ', dest, '.')
                 dests_num += 1
                 prev = dest
 
             endpoint = vehicle_dests[len(vehicle_dests) - 1]
-            cost += costs[prev][endpoint]
+            cost += float(costs[prev, endpoint])
             print('    Endpoint : ', endpoint, '.')
 
             print('')
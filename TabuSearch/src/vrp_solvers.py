@@ -1,8 +1,13 @@
 from math import sqrt
 import random
 from qubo_helper import Qubo
+from tour_split import split_tour
+from giant_tour import neighbor_lists, nearest_neighbor_tour, improve_tour, \
+        double_bridge, is_symmetric, rotate_to
 from vrp_problem import VRPProblem
-from vrp_solution import VRPSolution
+from cost_matrix import is_oracle
+from vrp_solution import VRPSolution, warm_start_states
+from penalties import PenaltyCalibrator, calibrate_penalties, invalid_fraction
 from itertools import product
 import DWaveSolvers
 import networkx as nx
@@ -27,61 +32,196 @@ class VRPSolver:
     # It is recommended to set order_const = 1 and only_one_const
     # big enough to make solutions correct. Bigger than sum of all
     # costs should be enough.
-    def solve(self, only_one_const, order_const, solver_type = 'cpu'):
+    # If constants are None, they are calibrated from costs of problem (see penalties).
+    def solve(self, only_one_const = None, order_const = None, solver_type = 'cpu'):
         pass
 
+    # Returns QuboEstimate of the biggest qubo built by solve (None if solver doesn't use qubos).
+    def estimate(self):
+        return None
+
+# Returns initial states of sampling encoding solution and its perturbed copies
+# (see warm_start_states) or None if there is no solution or it doesn't fit limits.
+# symmetry_breaking - if True, routes are ordered as required by get_symmetry_mask.
+def _warm_start(solution, vehicle_limits, count, symmetry_breaking = False):
+    if solution is None or count == 0:
+        return None
+    if symmetry_breaking:
+        solution = VRPSolution(solution.problem, None, None,
+                solution.problem.order_routes(solution.solution))
+    try:
+        vector = solution.encode(vehicle_limits)
+    except ValueError:
+        return None
+    table = solution.problem.get_step_index(sum(vehicle_limits))
+    return warm_start_states(vector, table, count)
+
+# Returns the biggest cost (its upper bound for DistanceOracle, found from coordinates,
+# so solvers of big instances don't compute all costs).
+def _max_cost(costs):
+    if is_oracle(costs):
+        return costs.max_bound()
+    return max(map(max, costs))
+
+# Returns sum of all costs (its upper bound for DistanceOracle, as in _max_cost).
+def _total_cost(costs):
+    if is_oracle(costs):
+        return len(costs) ** 2 * costs.max_bound()
+    return sum(map(sum, costs))
+
+# Returns constants of qubo of solver : given ones or, if they are None, constants of
+# PenaltyCalibrator of solver for its problem.
+def _penalties(solver, only_one_const, order_const):
+    if only_one_const is not None and order_const is not None:
+        return only_one_const, order_const
+    calibrated = solver.calibrator.consts(solver.problem)
+    return (calibrated[0] if only_one_const is None else only_one_const,
+            calibrated[1] if order_const is None else order_const)
+
+# Solves qubo of solver and returns the best sample (as DWaveSolvers.solve_qubo).
+# If calibrated constants were used and solver is adaptive, all reads are sampled
+# and calibrator is updated with fraction of invalid ones. Otherwise only the best
+# sample is materialized.
+def _solve_qubo(solver, qubo, solver_type, initial_states, only_one_const, order_const,
+        vehicle_limits):
+    if not solver.adaptive or (only_one_const is not None and order_const is not None):
+        return DWaveSolvers.solve_qubo(qubo, solver_type = solver_type,
+                initial_states = initial_states)
+    samples, variables, energies = DWaveSolvers.sample_qubo(qubo, solver_type = solver_type,
+            initial_states = initial_states)
+    solver.calibrator.update(invalid_fraction(solver.problem, samples, vehicle_limits, variables))
+    vector = np.zeros(qubo.size(), dtype=np.int8)
+    vector[variables] = samples[np.argmin(energies)]
+    return vector
+
 # Solver solves VRP only by QUBO formulation.
+# Attributes : initial_solution - VRPSolution of the same problem (for example from ClarkWright)
+# used to warm start sampling (None - random initial states).
+# warm_starts - number of initial states : solution and its perturbed copies.
+# compact - if True, qubo from get_compact_qubo is used : vehicles have only as many steps
+# as destinations fitting their capacities and variables excluded by time windows are removed.
+# adaptive - if True, calibrated constants are adapted after every solve
+# to fraction of invalid samples (see PenaltyCalibrator).
+# symmetry_breaking - if True, equivalent orders of identical vehicles are removed from qubo
+# (see VRPProblem.get_symmetry_mask).
 class FullQuboSolver(VRPSolver):
-    def solve(self, only_one_const, order_const, solver_type = 'cpu'):
-        qubo = self.problem.get_full_qubo(only_one_const, order_const)
-        sample = DWaveSolvers.solve_qubo(qubo, solver_type = solver_type)
-        solution = VRPSolution(self.problem, sample)
+    def __init__(self, problem, initial_solution = None, warm_starts = 10, compact = False,
+            adaptive = False, symmetry_breaking = False):
+        self.problem = problem
+        self.initial_solution = initial_solution
+        self.warm_starts = warm_starts
+        self.compact = compact
+        self.adaptive = adaptive
+        self.symmetry_breaking = symmetry_breaking
+        self.calibrator = PenaltyCalibrator(adaptive)
+
+    # Returns maximum numbers of deliveries of vehicles in qubo.
+    def _limits(self):
+        if self.compact:
+            return self.problem.max_route_lengths()
+        dests = len(self.problem.dests)
+        return [dests for _ in range(len(self.problem.capacities))]
+
+    def estimate(self):
+        return self.problem.estimate_qubo_with_limits(self._limits())
+
+    def solve(self, only_one_const = None, order_const = None, solver_type = 'cpu'):
+        consts = _penalties(self, only_one_const, order_const)
+        if self.compact:
+            qubo = self.problem.get_compact_qubo(*consts, symmetry_breaking = self.symmetry_breaking)
+        else:
+            qubo = self.problem.get_full_qubo(*consts, symmetry_breaking = self.symmetry_breaking)
+        limits = self._limits()
+        initial_states = _warm_start(self.initial_solution, limits, self.warm_starts,
+                self.symmetry_breaking)
+        sample = _solve_qubo(self, qubo, solver_type, initial_states, only_one_const, order_const,
+                limits)
+        solution = VRPSolution(self.problem, sample, limits)
         return solution
 
 # Solver assumes that every vehicle serves approximately the same number of deliveries.
 # Additional attribute : limit_radius - maximum difference between served number of deliveries
 # and average number of deliveries that every vehicle should serve.
+# initial_solution, warm_starts, adaptive, symmetry_breaking - as in FullQuboSolver.
+# Solution is used only if its routes fit limits of vehicles.
 class AveragePartitionSolver(VRPSolver):
-    def __init__(self, problem, limit_radius = 1):
+    def __init__(self, problem, limit_radius = 1, initial_solution = None, warm_starts = 10,
+            adaptive = False, symmetry_breaking = False):
         self.problem = problem
         self.limit_radius = limit_radius
-
-    def solve(self, only_one_const, order_const, solver_type = 'cpu'):
+        self.initial_solution = initial_solution
+        self.warm_starts = warm_starts
+        self.adaptive = adaptive
+        self.symmetry_breaking = symmetry_breaking
+        self.calibrator = PenaltyCalibrator(adaptive)
+
+    # Returns limits of numbers of deliveries of vehicles.
+    def _limits(self):
         dests = len(self.problem.dests)
         vehicles = len(self.problem.capacities)
 
         avg = int(dests / vehicles)
         limit_radius = self.limit_radius
 
-        limits = [(max(avg - limit_radius, 0), min(avg + limit_radius, dests)) for _ in range(vehicles)]
+        return [(max(avg - limit_radius, 0), min(avg + limit_radius, dests)) for _ in range(vehicles)]
+
+    def estimate(self):
+        return self.problem.estimate_qubo_with_both_limits(self._limits())
+
+    def solve(self, only_one_const = None, order_const = None, solver_type = 'cpu'):
+        limits = self._limits()
         max_limits = [r for (_, r) in limits]
 
         vrp_qubo = self.problem.get_qubo_with_both_limits(limits,
-                only_one_const, order_const)
+                *_penalties(self, only_one_const, order_const), self.symmetry_breaking)
 
-        sample = DWaveSolvers.solve_qubo(vrp_qubo, solver_type = solver_type)
+        initial_states = _warm_start(self.initial_solution, max_limits, self.warm_starts,
+                self.symmetry_breaking)
+        sample = _solve_qubo(self, vrp_qubo, solver_type, initial_states, only_one_const,
+                order_const, max_limits)
 
         solution = VRPSolution(self.problem, sample, max_limits)
         return solution
 
+# Solves problems with full qubos in one batch. Returns list of solutions in order of problems.
+# workers - number of workers of DWaveSolvers.solve_qubos.
+# Constants which are None are calibrated for every problem.
+def _solve_full_qubos(problems, only_one_const, order_const, solver_type, workers):
+    qubos = list()
+    for problem in problems:
+        calibrated = calibrate_penalties(problem)
+        qubos.append(problem.get_full_qubo(
+                calibrated[0] if only_one_const is None else only_one_const,
+                calibrated[1] if order_const is None else order_const))
+    results = DWaveSolvers.solve_qubos(qubos, solver_type = solver_type, workers = workers)
+    return [VRPSolution(problem, sample) for problem, (sample, _) in zip(problems, results)]
+
 # Solver uses DBScan to divide problem into subproblems that can be solved effectively by FullQuboSolver.
 # Attributes : max_len - maximum number of deliveries in problems solved by FullQuboSolver.
 # anti_noiser : True if dbscan should eliminate singleton clusters, False otherwise.
+# workers : number of workers solving qubos of clusters in batch (1 - one by one).
 class DBScanSolver(VRPSolver):
 
-    def __init__(self, problem, max_len = 10, anti_noiser = True):
+    def __init__(self, problem, max_len = 10, anti_noiser = True, workers = 1):
         self.problem = problem
         self.anti_noiser = anti_noiser
         self.max_len = max_len
+        self.workers = workers
         self.max_weight = max(problem.capacities)
-        self.max_dist = 2 * max(map(max, problem.costs))
+        self.max_dist = 2 * _max_cost(problem.costs)
+
+    # Clusters have at most max_len destinations and are solved by FullQuboSolver with one vehicle.
+    def estimate(self):
+        problem = self.problem
+        cluster = problem.dests[:self.max_len]
+        return problem.derive(dests = cluster, capacities = [problem.capacities[0]]).estimate_full_qubo()
 
     # Returns subset of dests with elements x that satisfies
     # costs[source][x] + costs[x][source] <= 2 * radius
     def _range_query(self, dests, costs, source, radius):
         result = list()
         for dest in dests:
-            if (costs[source][dest] + costs[dest][source]) / 2 <= radius:
+            if (costs[source, dest] + costs[dest, source]) / 2 <= radius:
                 result.append(dest)
         return result
 
@@ -122,9 +262,9 @@ class DBScanSolver(VRPSolver):
                 best_neighbour = -1
                 for d in dests:
                     if states[d] != -1:
-                        if costs[d][dest] < min_dist:
+                        if costs[d, dest] < min_dist:
                             best_neighbour = d
-                            min_dist = costs[d][dest]
+                            min_dist = costs[d, dest]
                 if best_neighbour == -1:
                     clusters_num += 1
                     states[dest] = clusters_num
@@ -209,7 +349,7 @@ class DBScanSolver(VRPSolver):
 
                     for dest in cluster:
                         weight += self.problem.weights[dest]
-                        min_dist = min(min_dist, costs[dest][one])
+                        min_dist = min(min_dist, costs[dest, one])
                     if weight + self.problem.weights[one] <= max_weight:
                         if best_dist > min_dist:
                             best_dist = min_dist
@@ -223,7 +363,7 @@ class DBScanSolver(VRPSolver):
 
         return best_res
 
-    def solve(self, only_one_const, order_const, solver_type = 'cpu'):
+    def solve(self, only_one_const = None, order_const = None, solver_type = 'cpu'):
         problem = self.problem
         dests = problem.dests
         costs = problem.costs
@@ -240,25 +380,20 @@ class DBScanSolver(VRPSolver):
 
         # If we have as much small clusters as vehicles, we can solve TSP for every cluster.
         if len(clusters) == vehicles:
-            result = list()
-            for cluster in clusters:
-                new_problem = VRPProblem(sources, costs, [capacities[0]], cluster, weights)
-                solver = FullQuboSolver(new_problem)
-                solution = solver.solve(only_one_const, order_const,
-                                    solver_type = solver_type).solution[0]
-                result.append(solution)
+            new_problems = [problem.derive(dests = cluster, capacities = [capacities[0]])
+                    for cluster in clusters]
+            result = [solution.solution[0] for solution in _solve_full_qubos(new_problems,
+                    only_one_const, order_const, solver_type, self.workers)]
             return VRPSolution(problem, None, None, result)
 
         solutions = list()
         solutions.append(VRPSolution(problem, None, None, [[0]]))
 
         # Solving TSP for every cluster.
-        for cluster in clusters:
-            new_problem = VRPProblem(sources, costs, [capacities[0]], cluster, weights,
-                                 first_source = False, last_source = False)
-            solver = FullQuboSolver(new_problem)
-            solution = solver.solve(only_one_const, order_const, solver_type = solver_type)
-            solutions.append(solution)
+        new_problems = [problem.derive(dests = cluster, capacities = [capacities[0]],
+                first_source = False, last_source = False) for cluster in clusters]
+        solutions += _solve_full_qubos(new_problems, only_one_const, order_const,
+                solver_type, self.workers)
 
         # Creating smaller instance of problem for DBScanSolver.
         clusters_num = len(clusters) + 1
@@ -272,14 +407,14 @@ class DBScanSolver(VRPSolver):
                 continue
             id1 = solutions[i].solution[0][-1]
             id2 = solutions[j].solution[0][0]
-            new_costs[i][j] = costs[id1][id2]
+            new_costs[i][j] = costs[id1, id2]
 
         for i in range(clusters_num):
             for dest in solutions[i].solution[0]:
                 new_weights[i] += weights[dest]
 
         new_problem = VRPProblem(sources, new_costs, capacities, new_dests, new_weights)
-        solver = DBScanSolver(new_problem)
+        solver = DBScanSolver(new_problem, workers = self.workers)
         compressed_solution = solver.solve(only_one_const, order_const, 
                             solver_type = solver_type).solution
 
@@ -345,9 +480,9 @@ class TabuSolver(VRPSolver):
         total_cost = 0
         prev = sources[0]  # Assuming single source for simplicity
         for dest in route:
-            total_cost += costs[prev][dest]
+            total_cost += float(costs[prev, dest])
             prev = dest
-        total_cost += costs[prev][sources[0]]  # Return to source
+        total_cost += float(costs[prev][sources[0]])  # Return to source
         return total_cost
     
     def check_time(self, route):
@@ -362,7 +497,7 @@ class TabuSolver(VRPSolver):
         for i in range(len(route) - 1):
             prevNode = route[i]
             currentNode = route[i + 1]
-            travel_time = costs[prevNode][currentNode]
+            travel_time = float(costs[prevNode, currentNode])
             readyTime = timeIntervals[str(currentNode)][0]
             dueTime = timeIntervals[str(currentNode)][1]
                         
@@ -396,7 +531,7 @@ class TabuSolver(VRPSolver):
         for i in range(len(route) - 1):
             prevNode = route[i]
             currentNode = route[i + 1]
-            travel_time = costs[prevNode][currentNode]
+            travel_time = float(costs[prevNode, currentNode])
             readyTime = timeIntervals[str(currentNode)][0]
             dueTime = timeIntervals[str(currentNode)][1]
                         
@@ -427,8 +562,14 @@ class TabuSolver(VRPSolver):
 
     def update_neighborhood(self, dests, costs, weights, size):
         neighborhood = [[] for _ in range(len(weights))]
+        # Oracle gives nearest nodes (without node itself) from coordinates, without rows of costs.
+        if is_oracle(costs):
+            nearest = costs.nearest(np.arange(len(weights)), int(size) - 1)
+            for d in dests:
+                neighborhood[d] = np.append(d, nearest[d])
+            return neighborhood
         for d in dests:
-            indices = np.argpartition(costs[d][:], int(size))[:int(size)]
+            indices = np.argpartition(costs[d, :], int(size))[:int(size)]
             neighborhood[d] = indices
         return neighborhood
 
@@ -437,9 +578,9 @@ class TabuSolver(VRPSolver):
         self.anti_noiser = anti_noiser
         self.max_len = max_len
         self.max_weight = max(problem.capacities)
-        self.max_dist = sum(map(sum, problem.costs))
+        self.max_dist = _total_cost(problem.costs)
 
-    def solve(self, only_one_const, order_const, solver_type = 'cpu'):
+    def solve(self, only_one_const = None, order_const = None, solver_type = 'cpu'):
         problem = self.problem
         dests = problem.dests
         N = len(dests)
@@ -457,7 +598,7 @@ class TabuSolver(VRPSolver):
         # When we do swaps below we only swap locations that are in the same neighborhood
         neighborhood = self.update_neighborhood(dests, costs, weights, vehicles * 2)
 
-        sorted_dests = sorted(dests, reverse=True , key=lambda i: costs[problem.in_nearest_sources[i]][i]) #costs[0][i]
+        sorted_dests = sorted(dests, reverse=True , key=lambda i: costs[problem.in_nearest_sources[i], i]) #costs[0][i]
         sorted_dests = [item for item in sorted_dests if item in dests]
 
         #Generate a starting solution for Tabu Search (1, 2 3)
@@ -498,10 +639,7 @@ class TabuSolver(VRPSolver):
         DEPOT_RETURN_TIME = time_intervals['0'][1]
 
 
-        neighborhood = [[] for _ in range(len(weights))]
-        for d in dests:
-            indices = np.argpartition(costs[d][:], int(vehicles * 2))[:int(vehicles * 2)]
-            neighborhood[d] = indices
+        neighborhood = self.update_neighborhood(dests, costs, weights, vehicles * 2)
 
         # 5. while not ready to stop
         while ready_to_stop is False:
@@ -884,7 +1022,7 @@ class TabuSolver(VRPSolver):
 
                             # Objective: Minimize travel cost
                             objective = sum(
-                                costs[i][j] * variables[i] * variables[j]
+                                costs[i, j] * variables[i] * variables[j]
                                 for i, j in itertools.combinations(cluster_with_depot, 2)
                             )
                             cqm.set_objective(objective)
@@ -913,7 +1051,7 @@ class TabuSolver(VRPSolver):
                                 service_time = services[0]
 
                                 travel_time_expr = sum(
-                                    costs[int(prev)][int(node)] * variables[prev]
+                                    costs[int(prev), int(node)] * variables[prev]
                                     for prev in cluster_with_depot if prev != node
                                 )
 
@@ -993,89 +1131,68 @@ class SolutionPartitioningSolver(VRPSolver):
         self.problem = problem
         self.solver = solver
         self.random = random
-        self.inf = 2 * sum(map(sum, problem.costs))
+        self.inf = 2 * _total_cost(problem.costs)
+
+    # Solver given in constructor solves TSP with one vehicle.
+    def estimate(self):
+        solver = copy.copy(self.solver)
+        solver.set_problem(self.problem.derive(capacities = [sum(self.problem.weights)]))
+        return solver.estimate()
     
     # Divides TSP solution to continous parts that will be correct VRP solution.
-    def _divide_solution_greedy_dp(self, solution):
+    # Vehicles are used in order of capacities list (problem.capacities by default).
+    # Returns pair (cost, VRPSolution) or (None, None) if solution can't be divided.
+    def _divide_solution_greedy_dp(self, solution, capacities = None):
         problem = self.problem
-        capacities = problem.capacities
-        costs = problem.costs
-        weights = problem.weights
+        if capacities is None:
+            capacities = problem.capacities
+        source = problem.source
 
-        dests = len(solution)
-        vehicles = len(capacities)
-        div_costs = np.zeros(dests)
-        for i in range(1, dests - 1):
-            d1 = solution[i]
-            d2 = solution[i+1]
-            div_costs[i] = costs[d1][0] + costs[0][d2] - costs[d1][d2]
-
-        dp = np.zeros((dests, vehicles + 1), dtype=float)
-        prev_state = np.zeros((dests, vehicles + 1), dtype=int)
-
-        for i in range(dests):
-            if i != 0:
-                dp[i][0] = self.inf
-            for j in range(1, vehicles + 1):
-                cap = capacities[j-1]
-                pointer = i
-                dp[i][j] = dp[i][j-1]
-                prev_state[i][j] = i
-                while pointer > 0 and cap >= weights[solution[pointer]]:
-                    pointer -= 1
-                    new_cost = div_costs[pointer] + dp[pointer][j-1]
-                    if new_cost < dp[i][j]:
-                        dp[i][j] = new_cost
-                        prev_state[i][j] = pointer
-                    cap -= weights[solution[pointer + 1]]
-
-        new_solution = []
-        pointer = dests - 1
-        for j in reversed(range(1, vehicles + 1)):
-            prev = prev_state[pointer][j]
-            if prev != pointer:
-                lis = solution[(prev + 1):(pointer + 1)]
-                if prev != -1:
-                    lis = [0] + lis
-                if pointer != dests - 1:
-                    lis = lis + [0]
-                new_solution.append(lis)
-            else:
-                new_solution.append([])
-            pointer = prev
-        
-        new_solution.reverse()
-        return VRPSolution(problem, None, None, new_solution)
+        # First and last elements of TSP solution are sources.
+        tour = solution[1:-1]
+        cost, routes = split_tour(tour, problem.costs, problem.weights, capacities, source)
+        if routes is None:
+            return None, None
+
+        new_solution = [[source] + route + [source] if route else [] for route in routes]
+        return cost, VRPSolution(problem, None, None, new_solution)
 
     # Creates random permutations of vehicles and using _divide_solution_greedy for
-    # each of them. 
+    # each of them. Permutations giving the same order of capacities are divided only once,
+    # so for homogeneous fleet there is only one division.
     # random - number of permutations.
     def _divide_solution_random(self, solution):
         random = self.random
-        capacities = self.problem.capacities.copy()
+        capacities = list(self.problem.capacities)
         vehicles = len(capacities)
 
         new_solution = None
         best_cost = self.inf
+        divided = set()
+
+        if min(capacities, default = 0) == max(capacities, default = 0):
+            random = 1
 
         for i in range(random):
-            perm = np.random.permutation(vehicles)
-            inv = [list(perm).index(j) for j in range(vehicles)]
-            self.problem.capacities = [capacities[j] for j in perm]
+            perm = np.random.permutation(vehicles) if i != 0 else np.arange(vehicles)
+            perm_capacities = tuple(capacities[j] for j in perm)
+            if perm_capacities in divided:
+                continue
+            divided.add(perm_capacities)
 
-            new_sol = self._divide_solution_greedy_dp(solution)
-            new_cost = new_sol.total_cost()
+            new_cost, new_sol = self._divide_solution_greedy_dp(solution, perm_capacities)
 
-            if new_cost < best_cost and new_sol.check():
+            if new_sol is not None and new_cost < best_cost:
                 best_cost = new_cost
                 new_solution = new_sol
-                new_solution.solution = [new_sol.solution[j] for j in inv]
-
-            self.problem.capacities = capacities
+                routes = [None] * vehicles
+                for k in range(vehicles):
+                    routes[perm[k]] = new_sol.solution[k]
+                new_solution.solution = routes
 
         return new_solution
 
-    def solve(self, only_one_const, order_const, solver_type = 'cpu'):
+    def solve(self, only_one_const = None, order_const = None, solver_type = 'cpu'):
         problem = self.problem
         capacity = 0
         weights = problem.weights
@@ -1083,23 +1200,152 @@ class SolutionPartitioningSolver(VRPSolver):
             capacity += w
 
         # Creating new problem with one vehicle.
-        sources = [0]
         dests = problem.dests
-        costs = problem.costs
         new_capacities = [capacity]
-        new_problem = VRPProblem(sources, costs, new_capacities, dests, weights)
+        new_problem = problem.derive(capacities = new_capacities)
 
         if len(dests) == 0:
             sol = [[] for _ in range(len(problem.capacities))]
             return VRPSolution(problem, None, None, sol)
 
-        solver = self.solver
+        # Solver given in constructor can be shared, so its copy solves TSP.
+        solver = copy.copy(self.solver)
         solver.set_problem(new_problem)
         solution = solver.solve(only_one_const, order_const, solver_type = solver_type)
 
         sol = solution.solution[0]
         return self._divide_solution_random(sol)
 
+# Route-first cluster-second solver. Builds giant TSP tour with classical heuristics
+# (nearest neighbour, then 2-opt and Or-opt on neighbour lists), divides it into routes
+# with split_tour and perturbs the tour with double bridge moves, keeping the best division.
+# It doesn't use QUBO, so it is cheap baseline and starting solution for big instances.
+# If no tour can be divided between vehicles (for example some order doesn't fit any vehicle),
+# solution with empty routes is returned, its check returns False.
+# Attributes : iterations - number of perturbations of giant tour.
+# neighbors - size of neighbour lists used by local search.
+# seed - seed for random generator.
+class GiantTourSolver(VRPSolver):
+
+    def __init__(self, problem, iterations = 100, neighbors = 10, seed = None):
+        self.problem = problem
+        self.iterations = iterations
+        self.neighbors = neighbors
+        self.seed = seed
+
+    # Divides giant tour starting in source into routes of vehicles.
+    def _split(self, tour):
+        problem = self.problem
+        return split_tour(tour[1:], problem.costs, problem.weights,
+                problem.capacities, problem.source)
+
+    # Parameters are ignored, they are kept for compatibility with VRPSolver.
+    def solve(self, only_one_const = None, order_const = None, solver_type = 'cpu'):
+        problem = self.problem
+        dests = list(problem.dests)
+        source = problem.source
+        costs = problem.costs
+        vehicles = len(problem.capacities)
+        rng = np.random.default_rng(self.seed)
+
+        empty = VRPSolution(problem, None, None, [[] for _ in range(vehicles)])
+        if len(dests) == 0:
+            return empty
+
+        neighbors = neighbor_lists(costs, [source] + dests, self.neighbors)
+        two_opt = is_symmetric(costs)
+
+        tour = nearest_neighbor_tour(costs, source, dests, neighbors)
+        tour = rotate_to(improve_tour(tour, costs, neighbors, two_opt = two_opt), source)
+        best_tour = tour
+        best_cost, best_routes = self._split(tour)
+
+        # Iterated local search on giant tour.
+        for _ in range(self.iterations):
+            tour, touched = double_bridge(best_tour, rng)
+            tour = improve_tour(tour, costs, neighbors, touched, two_opt)
+            tour = rotate_to(tour, source)
+            cost, routes = self._split(tour)
+            if routes is not None and (best_routes is None or cost < best_cost):
+                best_tour = tour
+                best_cost = cost
+                best_routes = routes
+
+        if best_routes is None:
+            return empty
+
+        # Adding first and last magazine.
+        for l in best_routes:
+            if len(l) != 0:
+                if problem.first_source:
+                    l.insert(0, problem.in_nearest_sources[l[0]])
+                if problem.last_source:
+                    l.append(problem.out_nearest_sources[l[len(l) - 1]])
+
+        return VRPSolution(problem, None, None, best_routes)
+
+# Solver checking size of qubo of another solver before solving. If predicted memory
+# of the qubo exceeds memory_budget (in bytes), problem is solved by DBScanSolver
+# with clusters small enough to fit the budget or, if fallback is 'classical' or even
+# one destination doesn't fit, by GiantTourSolver (its solution can be invalid
+# if orders can't be divided between vehicles, see GiantTourSolver).
+# Attributes : solver - solver used if its qubo fits the budget.
+# fallback - 'dbscan', 'classical' or None (MemoryError is raised for too big qubos).
+class MemoryBudgetSolver(VRPSolver):
+
+    def __init__(self, problem, solver, memory_budget = 2 ** 31, fallback = 'dbscan'):
+        self.problem = problem
+        self.solver = solver
+        self.memory_budget = memory_budget
+        self.fallback = fallback
+
+    def set_problem(self, problem):
+        self.problem = problem
+        self.solver = copy.copy(self.solver)
+        self.solver.set_problem(problem)
+
+    def _fits(self, estimate):
+        return estimate is None or estimate.memory <= self.memory_budget
+
+    # Returns the biggest max_len of DBScanSolver fitting the budget (0 if there is none).
+    def _max_cluster(self):
+        problem = self.problem
+        dests = problem.dests
+        low, high = 0, len(dests)
+        while low < high:
+            middle = (low + high + 1) // 2
+            cluster = problem.derive(dests = dests[:middle], capacities = [problem.capacities[0]])
+            if self._fits(cluster.estimate_full_qubo()):
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    # Returns solver used for problem : solver given in constructor or fallback solver.
+    def choose_solver(self):
+        solver = self.solver
+        if solver.problem is not self.problem:
+            solver = copy.copy(solver)
+            solver.set_problem(self.problem)
+        estimate = solver.estimate()
+        if self._fits(estimate):
+            return solver
+
+        if self.fallback is None:
+            raise MemoryError('Qubo of ' + type(solver).__name__ + ' needs about ' +
+                    str(estimate.memory) + ' bytes, budget is ' + str(self.memory_budget) + ' bytes.')
+        if self.fallback == 'dbscan':
+            max_len = self._max_cluster()
+            if max_len != 0:
+                return DBScanSolver(self.problem, max_len = max_len)
+        return GiantTourSolver(self.problem)
+
+    def estimate(self):
+        return self.choose_solver().estimate()
+
+    def solve(self, only_one_const = None, order_const = None, solver_type = 'cpu'):
+        return self.choose_solver().solve(only_one_const, order_const, solver_type = solver_type)
+
 class ClarkWright(VRPSolver):
     def __init__(self, problem):
         self.problem = problem
@@ -1160,7 +1406,7 @@ class ClarkWright(VRPSolver):
         for i in range(len(route) - 1):
             prevNode = route[i]
             currentNode = route[i + 1]
-            travel_time = costs[prevNode][currentNode]
+            travel_time = float(costs[prevNode, currentNode])
             readyTime = timeIntervals[str(currentNode)][0]
             dueTime = timeIntervals[str(currentNode)][1]
             
@@ -1207,7 +1453,7 @@ class ClarkWright(VRPSolver):
         savings = np.zeros((num_customers, num_customers))
         for i in range(num_customers):
             for j in range(i+1, num_customers):
-                savings[i][j] = costs[0][i+1] + costs[0][j+1] - costs[i+1][j+1]
+                savings[i][j] = costs[0, i+1] + costs[0, j+1] - costs[i+1, j+1]
                 
         # Sort savings matrix in decreasing order
         savings_flat = [(i, j, savings[i][j]) for i in range(num_customers) for j in range(i+1, num_customers)]
@@ -0,0 +1,33 @@
+# Checks that calibrated constants make ground states of qubos of small instances correct.
+# Qubos have 16 variables, so all their states are checked.
+
+import sys
+import os
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_dir, 'src'))
+
+import numpy as np
+from input import read_test
+from penalties import calibrate_penalties, invalid_fraction
+
+test_path = os.path.join(project_dir, 'tests/cvrp/example3.test')
+
+# Returns all states of qubo (array states x variables) with the lowest energy.
+def ground_states(qubo):
+    rows, cols, values = qubo.get_coo()
+    size = qubo.size()
+    states = (np.arange(2 ** size)[:, None] >> np.arange(size)) & 1
+    energies = (states[:, rows] * states[:, cols] * values).sum(axis=1)
+    return states[np.isclose(energies, energies.min())]
+
+def test_ground_states_of_full_qubo_are_correct():
+    problem = read_test(test_path)
+    qubo = problem.get_qubo_with_limits([2, 2], *calibrate_penalties(problem))
+    assert invalid_fraction(problem, ground_states(qubo), [2, 2]) == 0.
+
+def test_ground_states_of_compact_qubo_are_correct():
+    problem = read_test(test_path)
+    qubo = problem.get_compact_qubo(*calibrate_penalties(problem))
+    limits = problem.max_route_lengths()
+    assert invalid_fraction(problem, ground_states(qubo), limits) == 0.
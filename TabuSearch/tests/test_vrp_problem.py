@@ -0,0 +1,29 @@
+# Checks qubos of vehicles which can't serve any destination.
+
+import sys
+import os
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_dir, 'src'))
+
+from input import read_test
+from vrp_solution import VRPSolution
+
+test_path = os.path.join(project_dir, 'tests/cvrp/example3.test')
+
+def test_vehicle_lighter_than_every_order_has_no_steps():
+    problem = read_test(test_path).derive(capacities = [0, 2, 2])
+    limits = problem.max_route_lengths()
+    assert limits == [0, 2, 2]
+
+    qubo = problem.get_compact_qubo(10., 1.)
+    assert qubo.size() == problem.get_qubo_with_limits([2, 2], 10., 1.).size()
+
+    routes = [[], [0, 3, 0], [0, 1, 2, 0]]
+    vector = VRPSolution(problem, None, None, routes).encode(limits)
+    assert VRPSolution(problem, vector, limits).solution == routes
+
+def test_zero_limit_in_qubo_with_limits():
+    problem = read_test(test_path)
+    qubo = problem.get_qubo_with_limits([2, 0], 10., 1.)
+    assert qubo.size() == problem.get_step_index(2).size